@@ -0,0 +1,208 @@
+# Benchmarks over the instances of a folder (default DATA_EPSD_00_DMAX_50)
+# python benchmark.py <name> [-wdir folder] [-nfiles n] [-n norders] [-tmax secs]
+# names: order_cost, branching, por, best_first, lds, pairwise, select, startup
+
+import os
+import sys
+import time
+import inspect
+import subprocess
+import numpy as np
+from codes.bb import *
+
+
+def list_instances(wdir, nfiles=None):
+    files = sorted([os.path.join(wdir, fn) for fn in os.listdir(wdir) if fn.endswith('.nmr')])
+    return files[:nfiles]
+
+
+def bench_order_cost(files, norders=1000, seed=0):
+    '''order_cost (one order at a time) vs order_cost_batch on random orders.'''
+    rng = np.random.default_rng(seed)
+    print('%-10s %6s %6s %10s %10s %8s' % ('instance', 'lenE', 'lenS', 'loop', 'batch', 'speedup'))
+    for fnmr in files:
+        nmr = NMR(fnmr)
+        eids = np.array(sorted(nmr.E))
+        orders = np.array([rng.permutation(eids) for _ in range(norders)])
+        # warm up (scipy import and incidence)
+        order_cost_batch(nmr, orders[:1])
+        tic = time.time()
+        costLOOP = [order_cost(order, nmr.E, nmr.S) for order in orders]
+        timeLOOP = time.time() - tic
+        tic = time.time()
+        costBATCH = order_cost_batch(nmr, orders)
+        timeBATCH = time.time() - tic
+        if list(costBATCH) != costLOOP:
+            raise ValueError('order_cost_batch does not match order_cost on %s' % fnmr)
+        name = os.path.basename(fnmr).replace('.nmr', '')
+        print('%-10s %6d %6d %10.4f %10.4f %8.1f' % (name, len(nmr.E), len(nmr.S), timeLOOP, timeBATCH, timeLOOP / timeBATCH))
+
+
+def bench_branching(files, tmax=10):
+    '''Nodes, best cost and time to the best order of BB for each branching strategy
+       (opt: the search was completed within tmax).'''
+    print('%-28s %-9s %10s %12s %8s %8s %4s' % ('instance', 'branching', 'nodes', 'cost', 'ttb', 'time', 'opt'))
+    for fnmr in files:
+        nmr = NMR(fnmr)
+        name = os.path.basename(fnmr).replace('.nmr', '')
+        for branching in BB_BRANCHING:
+            tic = time.time()
+            bb = BB(nmr, branching)
+            orderBB, costBB = bb.solve(tmax=tmax)
+            toc = time.time() - tic
+            print('%-28s %-9s %10d %12d %8.3f %8.3f %4s' % (name, branching, bb.nodes, costBB, bb.time_best, toc, not bb.timeout))
+
+
+def bench_por(files, tmax=10, branching='eid'):
+    '''Nodes and time of BB with and without the partial-order reduction.'''
+    print('%-28s %-5s %10s %12s %8s %4s' % ('instance', 'por', 'nodes', 'cost', 'time', 'opt'))
+    for fnmr in files:
+        nmr = NMR(fnmr)
+        name = os.path.basename(fnmr).replace('.nmr', '')
+        for por in [False, True]:
+            tic = time.time()
+            bb = BB(nmr, branching, por)
+            orderBB, costBB = bb.solve(tmax=tmax)
+            toc = time.time() - tic
+            print('%-28s %-5s %10d %12d %8.3f %4s' % (name, por, bb.nodes, costBB, toc, not bb.timeout))
+
+
+def bench_lds(files, tmax=10):
+    '''Best cost within tmax of BB and of the limited-discrepancy search around the
+       SBBU and greedy orders (k: last iteration completed).'''
+    print('%-28s %-10s %12s %8s %4s %4s' % ('instance', 'solver', 'cost', 'ttb', 'k', 'opt'))
+    for fnmr in files:
+        nmr = NMR(fnmr)
+        name = os.path.basename(fnmr).replace('.nmr', '')
+        bb = BB(nmr)
+        orderBB, costBB = bb.solve(tmax=tmax)
+        print('%-28s %-10s %12d %8.3f %4s %4s' % (name, 'BB', costBB, bb.time_best, '-', not bb.timeout))
+        for heuristic in ['sbbu', 'greedy']:
+            bb = BB(nmr)
+            orderLD, costLD = bb.solve_lds(tmax=tmax, heuristic=heuristic)
+            print('%-28s %-10s %12d %8.3f %4d %4s' % (name, 'LDS-' + heuristic, costLD, bb.time_best, bb.lds_k, not bb.timeout))
+
+
+def bench_best_first(files, tmax=10):
+    '''Nodes, time and memory of the DFS BB and of the best-first search with no cap and
+       with caps of 1/4 and 1/16 of the memory it needs (hybrid: the DFS fallback took
+       over, mem: estimated memory of the stored nodes, peak: traced allocations).'''
+    print('%-28s %-10s %10s %12s %8s %6s %10s %10s %8s %4s' % ('instance', 'solver', 'nodes', 'cost', 'time', 'hybrid', 'mem (MB)', 'peak (MB)', 'gap', 'opt'))
+    for fnmr in files:
+        nmr = NMR(fnmr)
+        name = os.path.basename(fnmr).replace('.nmr', '')
+        bb = BB(nmr)
+        tic = time.time()
+        order, cost = bb.solve(tmax=tmax)
+        print('%-28s %-10s %10d %12d %8.3f %6s %10s %10s %8s %4s' % (name, 'BB', bb.nodes, cost, time.time() - tic, '-', '-', '-', '-', not bb.timeout))
+        max_memory = BF_MAX_MEMORY
+        for label in ['BF', 'BF/4', 'BF/16']:
+            bb = BB(nmr)
+            probe = MemoryProbe()
+            probe.start()
+            tic = time.time()
+            order, cost = bb.solve_best_first(tmax=tmax, max_memory=max_memory)
+            toc = time.time() - tic
+            probe.stop('BF')
+            probe.close()
+            print('%-28s %-10s %10d %12d %8.3f %6s %10.3f %10.3f %8.4f %4s' % (name, label, bb.nodes, cost, toc, bb.hybrid,
+                  bb.memory / (1 << 20), probe.phases['BF'][0], bb.gap, not bb.timeout))
+            if label == 'BF':
+                max_memory = bb.memory
+            max_memory //= 4
+
+
+def bench_pairwise(files, tmax=10):
+    '''Nodes and time of BB and PriorityTree with and without the forced precedences and
+       the pairwise bound (pairs: overlapping edges, forced: forced precedences, inc: pairs
+       of the bound, gain: their increment of the class bound at the root).'''
+    print('%-28s %-6s %-5s %6s %6s %4s %12s %10s %12s %8s %4s' % ('instance', 'solver', 'pw', 'pairs', 'forced', 'inc', 'gain', 'nodes', 'cost', 'time', 'opt'))
+    for fnmr in files:
+        nmr = NMR(fnmr)
+        name = os.path.basename(fnmr).replace('.nmr', '')
+        pred = forced_precedences(nmr)
+        forced = sum(len(pred[eid]) for eid in pred)
+        D = pairwise_costs(nmr, pred)
+        inc = pairwise_increments(nmr, D)
+        gain = sum(d for a, b, d in inc)
+        for solver in ['BB', 'PT']:
+            for pairwise in [False, True]:
+                tic = time.time()
+                if solver == 'BB':
+                    search = BB(nmr, pairwise=pairwise)
+                    order, cost = search.solve(tmax=tmax)
+                else:
+                    search = PriorityTree(nmr, pairwise=pairwise)
+                    order, cost = search.solve(tmax=tmax)
+                toc = time.time() - tic
+                print('%-28s %-6s %-5s %6d %6d %4d %12d %10d %12d %8.3f %4s' % (name, solver, pairwise, len(D), forced, len(inc), gain, search.nodes, cost, toc, not search.timeout))
+
+
+def bench_select(files, tmax=10):
+    '''Nodes and time of PriorityTree for each segment selection rule, with and without
+       the forced precedences.'''
+    print('%-28s %-7s %-5s %10s %12s %8s %4s' % ('instance', 'select', 'pw', 'nodes', 'cost', 'time', 'opt'))
+    for fnmr in files:
+        nmr = NMR(fnmr)
+        name = os.path.basename(fnmr).replace('.nmr', '')
+        for pairwise in [False, True]:
+            for select in PT_SELECT:
+                tic = time.time()
+                pt = PriorityTree(nmr, pairwise=pairwise, select=select)
+                orderPT, costPT = pt.solve(tmax=tmax)
+                toc = time.time() - tic
+                print('%-28s %-7s %-5s %10d %12d %8.3f %4s' % (name, select, pairwise, pt.nodes, costPT, toc, not pt.timeout))
+
+
+def bench_startup(files, nruns=5):
+    '''Cold start (new interpreter) of short runs, mean of nruns: the interpreter alone,
+       import of codes.bb, the same import with the modules it loaded before they were
+       deferred (eager), SBBU on one instance with solve.py, and SBBU on all the files
+       in one solve.py process vs one process per file.'''
+    root = os.path.dirname(os.path.abspath(__file__))
+    eager = 'import codes.bb, networkx, multiprocessing, pickle, copy, hashlib, sqlite3, tracemalloc'
+    runs = [('python', ['-c', 'pass']),
+            ('import', ['-c', 'import codes.bb']),
+            ('import (eager)', ['-c', eager]),
+            ('solve.py SB x1', ['solve.py', files[0], '-s', 'SB']),
+            ('solve.py SB x%d' % len(files), ['solve.py'] + files + ['-s', 'SB'])]
+
+    def wall(args):
+        tic = time.time()
+        subprocess.run([sys.executable] + args, cwd=root, stdout=subprocess.DEVNULL, check=True)
+        return time.time() - tic
+
+    print('%-28s %10s' % ('run', 'time'))
+    for name, args in runs:
+        print('%-28s %10.4f' % (name, np.mean([wall(args) for _ in range(nruns)])))
+    # one process per instance (the sweeps of run_all.py)
+    toc = np.mean([sum(wall(['solve.py', fnmr, '-s', 'SB']) for fnmr in files) for _ in range(nruns)])
+    print('%-28s %10.4f' % ('solve.py SB 1 x%d' % len(files), toc))
+
+
+BENCHMARKS = {'order_cost': bench_order_cost, 'branching': bench_branching, 'por': bench_por, 'best_first': bench_best_first, 'lds': bench_lds,
+              'pairwise': bench_pairwise, 'select': bench_select, 'startup': bench_startup}
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else 'order_cost'
+    if name not in BENCHMARKS:
+        print('Unknown benchmark %s (options: %s)' % (name, ', '.join(BENCHMARKS)))
+        sys.exit(1)
+    wdir = 'DATA_EPSD_00_DMAX_50'
+    nfiles = None
+    # options of the command line (each benchmark takes the ones it knows)
+    options = {}
+    for i, arg in enumerate(sys.argv):
+        if arg == '-wdir':
+            wdir = sys.argv[i+1]
+        if arg == '-nfiles':
+            nfiles = int(sys.argv[i+1])
+        if arg == '-n':
+            options['norders'] = int(sys.argv[i+1])
+        if arg == '-tmax':
+            options['tmax'] = float(sys.argv[i+1])
+
+    bench = BENCHMARKS[name]
+    params = inspect.signature(bench).parameters
+    bench(list_instances(wdir, nfiles), **{key: value for key, value in options.items() if key in params})
@@ -5,21 +5,31 @@
 import os
 import sys
 import time
-import copy
-import pickle
 import numpy as np
-import networkx as nx
+# networkx, scipy, multiprocessing, pickle, copy, hashlib, sqlite3 and tracemalloc are
+# imported by the functions using them (see solve.py: faster start of short runs)
 from functools import cmp_to_key
-from itertools import permutations
+from itertools import islice, permutations
 from heapq import heapify, heappop, heappush
+from bisect import bisect_left, bisect_right
+from queue import Empty
+from collections import OrderedDict
+try:
+    import resource
+except ImportError:
+    # not available on Windows (max RSS is not reported)
+    resource = None
 
 
 class NMRSegment:
     SID = 0  # class static variable
 
-    def __init__(self, i, j) -> None:
-        NMRSegment.SID += 1
-        self.sid = NMRSegment.SID
+    def __init__(self, i, j, sid=None) -> None:
+        if sid is None:
+            NMRSegment.SID += 1
+            sid = NMRSegment.SID
+        NMRSegment.SID = max(NMRSegment.SID, sid)
+        self.sid = sid
         self.i = i
         self.j = j
         # set of the indexes of the prune edges that cover this segment
@@ -44,9 +54,13 @@ class NMRSegment:
 class NMREdge:
     EID = 0  # class static variable
 
-    def __init__(self, i, j) -> None:
-        NMREdge.EID += 1
-        self.eid = NMREdge.EID  # edge id
+    def __init__(self, i, j, eid=None) -> None:
+        if eid is None:
+            NMREdge.EID += 1
+            eid = NMREdge.EID
+        # keep the counter ahead of the explicitly given ids
+        NMREdge.EID = max(NMREdge.EID, eid)
+        self.eid = eid  # edge id
         self.i = i
         self.j = j
         self.sid = set()  # set of the indexes of the segments covered by this edge
@@ -61,59 +75,561 @@ class NMREdge:
         NMREdge.EID = 0
 
 
+class IntervalIndex:
+    '''Static index of the closed intervals [lo[k], hi[k]] labelled by ids[k].
+       The intervals are sorted by lo and seen as the in-order sequence of an implicit
+       balanced binary tree where each node keeps the largest hi of its subtree, so
+       overlap queries cost O(log n + number of intervals reported).
+    '''
+
+    def __init__(self, lo, hi, ids) -> None:
+        order = sorted(range(len(ids)), key=lambda k: (lo[k], hi[k]))
+        self.lo = [int(lo[k]) for k in order]
+        self.hi = [int(hi[k]) for k in order]
+        self.ids = [ids[k] for k in order]
+        self.maxhi = [0] * len(self.ids)
+        self._build(0, len(self.ids))
+
+    def _build(self, a, b):
+        if a >= b:
+            return -np.inf
+        m = (a + b) // 2
+        self.maxhi[m] = max(self.hi[m], self._build(a, m), self._build(m + 1, b))
+        return self.maxhi[m]
+
+    def overlapping(self, lo, hi):
+        '''Sorted ids of the intervals intersecting [lo, hi].'''
+        found = []
+        stack = [(0, len(self.ids))]
+        while len(stack) > 0:
+            a, b = stack.pop()
+            if a >= b:
+                continue
+            m = (a + b) // 2
+            # the whole subtree ends before lo
+            if self.maxhi[m] < lo:
+                continue
+            stack.append((a, m))
+            # the right subtree starts after lo[m]
+            if self.lo[m] <= hi:
+                if self.hi[m] >= lo:
+                    found.append(m)
+                stack.append((m + 1, b))
+        return sorted(self.ids[m] for m in found)
+
+    def stabbing(self, k):
+        '''Sorted ids of the intervals containing k.'''
+        return self.overlapping(k, k)
+
+
+# number of rows read at once by the streaming reader
+CHUNK_SIZE = 1 << 16
+# header of the binary edge file: magic, nnodes, number of prune edges, unused
+NMR_BIN_MAGIC = 0x4E4D5242
+
+
+def read_prune_edges(fnmr: str, chunk_size=CHUNK_SIZE):
+    '''Read fnmr in blocks of chunk_size rows keeping only the prune edges.
+       Returns nnodes and an int32 array with one row (eid, i, j) per prune edge.
+       The eid's are the row numbers in the file, as in the NMR default reader.
+    '''
+    nnodes, eid, blocks = 0, 0, []
+    with open(fnmr, 'r') as fid:
+        while True:
+            rows = list(islice(fid, chunk_size))
+            if len(rows) == 0:
+                break
+            IJ = np.array([row.split()[:2] for row in rows], dtype=np.int32)
+            I, J = IJ[:, 0], IJ[:, 1]
+            eids = np.arange(eid + 1, eid + len(rows) + 1, dtype=np.int32)
+            eid += len(rows)
+            nnodes = max(nnodes, int(J.max()))
+            mask = J > I + 3
+            blocks.append(np.column_stack((eids[mask], I[mask], J[mask])))
+    A = np.concatenate(blocks) if len(blocks) > 0 else np.zeros((0, 3), dtype=np.int32)
+    return nnodes, A.astype(np.int32)
+
+
+def write_nmr_bin(fnmr: str, fbin=None, chunk_size=CHUNK_SIZE):
+    '''Convert the text file fnmr to the binary edge file fbin (prune edges only).'''
+    if fbin is None:
+        fbin = fnmr.replace('.nmr', '.bin')
+    nnodes, A = read_prune_edges(fnmr, chunk_size)
+    header = np.array([NMR_BIN_MAGIC, nnodes, len(A), 0], dtype=np.int32)
+    # write to a temporary file first, so readers never see a partial file
+    ftmp = fbin + '.tmp'
+    with open(ftmp, 'wb') as fid:
+        header.tofile(fid)
+        A.tofile(fid)
+    os.replace(ftmp, fbin)
+    return fbin
+
+
+def load_nmr_bin(fbin: str):
+    '''Memory-map the binary edge file fbin.
+       Returns nnodes and a read-only (eid, i, j) int32 array backed by the file.
+    '''
+    header = np.fromfile(fbin, dtype=np.int32, count=4)
+    if len(header) < 4 or header[0] != NMR_BIN_MAGIC:
+        raise ValueError('%s is not a binary edge file' % fbin)
+    nnodes, nedges = int(header[1]), int(header[2])
+    if nedges == 0:
+        return nnodes, np.zeros((0, 3), dtype=np.int32)
+    A = np.memmap(fbin, dtype=np.int32, mode='r', offset=header.nbytes, shape=(nedges, 3))
+    return nnodes, A
+
+
+def nmr_hash(fnmr: str, chunk_size=1 << 20):
+    '''sha256 of the content of fnmr.'''
+    import hashlib
+    h = hashlib.sha256()
+    with open(fnmr, 'rb') as fid:
+        for block in iter(lambda: fid.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
 class NMR:
-    def __init__(self, fnmr: str) -> None:
+    def __init__(self, fnmr: str, stream=False, mmap=False, chunk_size=CHUNK_SIZE, cache=False, probe=None) -> None:
+        '''stream: read fnmr in blocks keeping only the prune edges (self.edges is left empty).
+           mmap: memory-map the binary edge file (fnmr with '.bin' extension), which is
+                 created or refreshed from fnmr when needed.
+           cache: load the preprocessed instance from fnmr with '.npz' extension when it
+                  matches the content hash of fnmr, otherwise build and save it.
+           probe: MemoryProbe, the reading of the edges is recorded as the 'Parse' phase.
+        '''
         self.fnmr = fnmr
         NMREdge.resetEID()
         self.edges = []
-        with open(fnmr, 'r') as fid:
-            for row in fid:
-                i = int(row.split()[0])
-                j = int(row.split()[1])
-                self.edges.append(NMREdge(i, j))
-        self.nnodes = np.max([edge.j for edge in self.edges])
-        self.pruneEdges = [edge for edge in self.edges if edge.j > edge.i + 3]
+        fhash = nmr_hash(fnmr) if cache else None
+        if cache and self._load_cache(fhash):
+            return
+        if mmap:
+            fbin = fnmr.replace('.nmr', '.bin')
+            if not os.path.exists(fbin) or os.path.getmtime(fbin) < os.path.getmtime(fnmr):
+                write_nmr_bin(fnmr, fbin, chunk_size)
+            self.nnodes, self.pruneArray = load_nmr_bin(fbin)
+        elif stream:
+            self.nnodes, self.pruneArray = read_prune_edges(fnmr, chunk_size)
+        else:
+            with open(fnmr, 'r') as fid:
+                for row in fid:
+                    i = int(row.split()[0])
+                    j = int(row.split()[1])
+                    self.edges.append(NMREdge(i, j))
+            self.nnodes = np.max([edge.j for edge in self.edges])
+            self.pruneArray = None
+        if stream or mmap:
+            self.pruneEdges = [NMREdge(i, j, eid) for eid, i, j in self.pruneArray.tolist()]
+        else:
+            self.pruneEdges = [edge for edge in self.edges if edge.j > edge.i + 3]
+        if probe is not None:
+            probe.stop('Parse')
+            probe.start()
         self.segments = self._segments()
         self.E, self.S = self._ordering_data()
+        if cache:
+            self._save_cache(fhash)
+
+    def _save_cache(self, fhash):
+        fcache = self.fnmr.replace('.nmr', '.npz')
+        # incidence edge -> segments in CSR format (rows follow self.pruneEdges)
+        indptr = np.cumsum([0] + [len(edge.sid) for edge in self.pruneEdges])
+        indices = [sid for edge in self.pruneEdges for sid in sorted(edge.sid)]
+        segments = [(s.sid, s.i, s.j) for s in self.segments]
+        data = {}
+        data['hash'] = np.array(fhash)
+        data['nnodes'] = np.array(self.nnodes)
+        data['edges'] = np.asarray(self.pruneArray, dtype=np.int32)
+        data['segments'] = np.array(segments, dtype=np.int32).reshape(-1, 3)
+        # log2 of the segments weights
+        data['logw'] = np.array([s.j - s.i + 1 for s in self.segments], dtype=np.int32)
+        data['indptr'] = np.array(indptr, dtype=np.int64)
+        data['indices'] = np.array(indices, dtype=np.int32)
+        # write to a temporary file first, so readers never see a partial file
+        ftmp = fcache + '.tmp'
+        with open(ftmp, 'wb') as fid:
+            np.savez(fid, **data)
+        os.replace(ftmp, fcache)
+
+    def _load_cache(self, fhash):
+        fcache = self.fnmr.replace('.nmr', '.npz')
+        if not os.path.exists(fcache):
+            return False
+        try:
+            with np.load(fcache) as data:
+                if str(data['hash']) != fhash:
+                    return False
+                self.nnodes = int(data['nnodes'])
+                self.pruneArray = data['edges']
+                segments, logw = data['segments'].tolist(), data['logw'].tolist()
+                indptr, indices = data['indptr'].tolist(), data['indices'].tolist()
+        except (OSError, ValueError, KeyError) as e:
+            print('> invalid cache %s: %s' % (fcache, e))
+            return False
+        NMRSegment.resetSID()
+        self.pruneEdges = [NMREdge(i, j, eid) for eid, i, j in self.pruneArray.tolist()]
+        self.segments = []
+        for (sid, i, j), w in zip(segments, logw):
+            s = NMRSegment(i, j, sid)
+            s.weight = int(2**w)
+            self.segments.append(s)
+        self.E, self.S = self._ordering_data()
+        self._build_index()
+        for k, edge in enumerate(self.pruneEdges):
+            for sid in indices[indptr[k]:indptr[k+1]]:
+                edge.add_sid(sid)
+                self.S[sid].add_eid(edge.eid)
+        return True
+
+    def _build_index(self):
+        '''Sorted start/end atoms of the segments (they are disjoint). The interval
+           index of the prune edges (covering [i+3, j]) is built on demand.'''
+        self._edgeIndex = None
+        self._nextEID, self._nextSID = None, None
+        self.segStart = [s.i for s in self.segments]
+        self.segEnd = [s.j for s in self.segments]
+
+    @property
+    def nextEID(self):
+        '''Next free edge id (see add_edge).'''
+        if self._nextEID is None:
+            self._nextEID = max([0] + list(self.E) + [edge.eid for edge in self.edges[-1:]]) + 1
+        return self._nextEID
+
+    @nextEID.setter
+    def nextEID(self, eid):
+        self._nextEID = eid
+
+    @property
+    def nextSID(self):
+        '''Next free segment id (see add_edge).'''
+        if self._nextSID is None:
+            self._nextSID = max([0] + list(self.S)) + 1
+        return self._nextSID
+
+    @nextSID.setter
+    def nextSID(self, sid):
+        self._nextSID = sid
+
+    @property
+    def pruneArray(self):
+        '''int32 array with one row (eid, i, j) per prune edge.'''
+        if self._pruneArray is None:
+            A = [(edge.eid, edge.i, edge.j) for edge in self.pruneEdges]
+            self._pruneArray = np.array(A, dtype=np.int32).reshape(-1, 3)
+        return self._pruneArray
+
+    @pruneArray.setter
+    def pruneArray(self, A):
+        self._pruneArray = A
+
+    @property
+    def edgeIndex(self):
+        if self._edgeIndex is None:
+            self._edgeIndex = IntervalIndex([edge.i + 3 for edge in self.pruneEdges],
+                                            [edge.j for edge in self.pruneEdges],
+                                            [edge.eid for edge in self.pruneEdges])
+        return self._edgeIndex
+
+    def edges_covering(self, k):
+        '''eids of the prune edges covering the atom k.'''
+        return self.edgeIndex.stabbing(k)
+
+    def edges_overlapping(self, lo, hi):
+        '''eids of the prune edges covering some atom in [lo, hi].'''
+        return self.edgeIndex.overlapping(lo, hi)
+
+    def segments_in(self, lo, hi):
+        '''sids of the segments inside the atom range [lo, hi].'''
+        a = bisect_left(self.segStart, lo)
+        b = bisect_right(self.segEnd, hi)
+        return [self.segments[k].sid for k in range(a, b)]
+
+    def segments_inside(self, eid):
+        '''sids of the segments covered by the prune edge eid.'''
+        edge = self.E[eid]
+        return self.segments_in(edge.i + 3, edge.j)
+
+    def _replace_segments(self, a, b, segments):
+        '''Replace self.segments[a:b] by segments (sorted, same atom range).'''
+        for s in self.segments[a:b]:
+            self.S.pop(s.sid)
+        for s in segments:
+            self.S[s.sid] = s
+        self.segments[a:b] = segments
+        self.segStart[a:b] = [s.i for s in segments]
+        self.segEnd[a:b] = [s.j for s in segments]
+
+    def add_edge(self, i, j):
+        '''Add the prune edge (i, j) in place.
+           Only the segments overlapping its covered range [i+3, j] are split (new sids),
+           the atoms of the range not covered yet become new segments and all the other
+           edges and segments keep their ids.
+           Returns the new eid and the changes {'added': sids, 'removed': sids,
+           'updated': sids}, where updated are the kept segments whose eid set changed.
+        '''
+        lo, hi = i + 3, j
+        if hi < lo:
+            raise ValueError('(%d, %d) is not a prune edge' % (i, j))
+        eid = self.nextEID
+        self.nextEID += 1
+        edge = NMREdge(i, j, eid)
+        changes = {'added': [], 'removed': [], 'updated': []}
+
+        def new_segment(a, b, eids):
+            s = NMRSegment(a, b, self.nextSID)
+            self.nextSID += 1
+            s.eid = set(eids)
+            changes['added'].append(s.sid)
+            return s
+
+        # segments[a:b] overlap [lo, hi]
+        a = bisect_left(self.segEnd, lo)
+        b = bisect_right(self.segStart, hi)
+        segments, k = [], lo  # k: first atom of [lo, hi] not visited yet
+        for s in self.segments[a:b]:
+            if k < s.i:
+                # uncovered atoms before s
+                segments.append(new_segment(k, min(s.i - 1, hi), []))
+            # cut s at the points lo and hi+1
+            P = [s.i] + [p for p in (lo, hi + 1) if s.i < p <= s.j] + [s.j + 1]
+            if len(P) == 2:
+                segments.append(s)
+                changes['updated'].append(s.sid)
+            else:
+                pieces = [new_segment(pa, pb - 1, s.eid) for pa, pb in zip(P[:-1], P[1:])]
+                for eidB in s.eid:
+                    self.E[eidB].sid.remove(s.sid)
+                    self.E[eidB].sid.update(piece.sid for piece in pieces)
+                changes['removed'].append(s.sid)
+                segments += pieces
+            k = s.j + 1
+        if k <= hi:
+            segments.append(new_segment(k, hi, []))
+        for s in segments:
+            if lo <= s.i and s.j <= hi:
+                s.add_eid(eid)
+                edge.add_sid(s.sid)
+        self._replace_segments(a, b, segments)
+
+        self.E[eid] = edge
+        self.pruneEdges.append(edge)
+        if len(self.edges) > 0:
+            self.edges.append(edge)
+        self._pruneArray = None
+        self.nnodes = max(self.nnodes, j)
+        self._edgeIndex = None
+        return eid, changes
+
+    def remove_edge(self, eid):
+        '''Remove the prune edge eid in place.
+           The segments covered only by eid are removed and, at the ends of its covered
+           range, neighbour segments covered by the same edges are merged (new sid).
+           All the other edges and segments keep their ids.
+           Returns the changes {'added': sids, 'removed': sids, 'updated': sids}.
+        '''
+        changes = self._remove_edge(eid)
+        self.pruneEdges = [edge for edge in self.pruneEdges if edge.eid in self.E]
+        self.edges = [edge for edge in self.edges if edge.eid != eid]
+        return changes
+
+    def _remove_edge(self, eid):
+        '''remove_edge without filtering self.pruneEdges and self.edges (left to the caller).'''
+        edge = self.E.pop(eid)
+        lo, hi = edge.i + 3, edge.j
+        added, removed, updated = [], [], set()
+        a = bisect_left(self.segStart, lo)
+        b = bisect_right(self.segEnd, hi)
+        segments = []
+        for s in self.segments[a:b]:
+            s.eid.discard(eid)
+            if len(s.eid) > 0:
+                segments.append(s)
+                updated.add(s.sid)
+            else:
+                removed.append(s.sid)
+        self._replace_segments(a, b, segments)
+
+        # merge the neighbour segments at the points lo and hi+1
+        for p in (lo, hi + 1):
+            k = bisect_left(self.segStart, p)
+            if k == 0 or k == len(self.segments):
+                continue
+            sA, sB = self.segments[k - 1], self.segments[k]
+            if sA.j + 1 != sB.i or sA.eid != sB.eid:
+                continue
+            s = NMRSegment(sA.i, sB.j, self.nextSID)
+            self.nextSID += 1
+            s.eid = set(sA.eid)
+            for eidB in s.eid:
+                self.E[eidB].sid -= {sA.sid, sB.sid}
+                self.E[eidB].add_sid(s.sid)
+            updated -= {sA.sid, sB.sid}
+            removed += [sA.sid, sB.sid]
+            added.append(s.sid)
+            self._replace_segments(k - 1, k + 1, [s])
+
+        self._pruneArray = None
+        self._edgeIndex = None
+        return {'added': added, 'removed': removed, 'updated': sorted(updated)}
+
+    def update_from(self, fnmr):
+        '''Turn this instance into the one in fnmr (e.g. the same protein with another
+           dmax) by removing/adding only the prune edges that differ, matched by (i, j).
+           Returns the changes accumulated as in add_edge/remove_edge.
+        '''
+        nnodes, A = read_prune_edges(fnmr)
+        IJ = set((i, j) for _, i, j in A.tolist())
+        cur = {(edge.i, edge.j): eid for eid, edge in self.E.items()}
+        added, removed, updated = set(), set(), set()
+
+        def merge(changes):
+            added.update(changes['added'])
+            for sid in changes['removed']:
+                if sid in added:
+                    added.remove(sid)
+                else:
+                    removed.add(sid)
+            updated.update(changes['updated'])
+
+        for ij in sorted(cur):
+            if ij not in IJ:
+                merge(self._remove_edge(cur[ij]))
+        self.pruneEdges = [edge for edge in self.pruneEdges if edge.eid in self.E]
+        # the other edges (discretization ones) are not updated
+        self.edges = []
+        for ij in sorted(IJ):
+            if ij not in cur:
+                merge(self.add_edge(*ij)[1])
+        self.fnmr = fnmr
+        self.nnodes = max(self.nnodes, nnodes)
+        updated -= added | removed
+        updated &= set(self.S)
+        return {'added': sorted(added), 'removed': sorted(removed), 'updated': sorted(updated)}
 
     def _segments(self):
         NMRSegment.resetSID()
-        # I: sorted list of all atoms covered by prune edges
-        I = set()
-        for edge in self.pruneEdges:
-            I.update(np.arange(edge.i + 3, edge.j + 1))
-        I = sorted(list(I))
-
-        # E[i]: set of the eid's of the edges covering atom 'i'
-        E = {i: set() for i in I}
+        # The set of edges covering an atom only changes at the points i+3 (an edge
+        # starts) and j+1 (an edge ends), so the atoms between two consecutive points
+        # are covered by the same edges and belong to the same segment.
+        # D[k]: variation of the number of edges covering the atoms at point k
+        D = {}
         for edge in self.pruneEdges:
-            for i in range(edge.i + 3, edge.j+1):
-                E[i].add(edge.eid)
-
-        # Consecutive atoms covered by the same set of edges belong to the same segment
+            D[edge.i + 3] = D.get(edge.i + 3, 0) + 1
+            D[edge.j + 1] = D.get(edge.j + 1, 0) - 1
+        P = sorted(D)
         S = []  # S: list of all segments
-        s = NMRSegment(I[0], I[0])
-        for j in I:
-            if E[s.i] == E[j]:
-                s.j = j
-            else:
-                # the s.i and s.j were possibly updated inside the loop, so it's necessary
-                # to update/correct the s.weight.
-                s.update_weight()
-                S.append(s)
-                s = NMRSegment(j, j)
-        s.update_weight()
-        S.append(s)
-
-        # O(len(S) * len(self.pruneEdges))
-        for s in S:
-            for edge in self.pruneEdges:
-                if edge.check_cover(s):
-                    edge.add_sid(s.sid)
-                    s.add_eid(edge.eid)
+        ncover = 0
+        for a, b in zip(P[:-1], P[1:]):
+            ncover += D[a]
+            if ncover > 0:
+                S.append(NMRSegment(int(a), int(b - 1)))
+        self.segments = S
+        self._build_index()
+
+        # each edge covers the consecutive segments inside [i+3, j]
+        for edge in self.pruneEdges:
+            for k in range(bisect_left(self.segStart, edge.i + 3), bisect_right(self.segEnd, edge.j)):
+                s = S[k]
+                edge.add_sid(s.sid)
+                s.add_eid(edge.eid)
         return S
 
+    def incidence(self):
+        '''Sparse (scipy CSR) incidence matrix A with A[k, l] = 1 when the prune edge
+           self.pruneEdges[k] covers the segment self.segments[l].
+           Returns A and the eids and sids of its rows and columns.
+        '''
+        import scipy.sparse as sp
+        # each edge covers the consecutive segments a:b
+        a = np.searchsorted(self.segStart, [edge.i + 3 for edge in self.pruneEdges], 'left')
+        b = np.searchsorted(self.segEnd, [edge.j for edge in self.pruneEdges], 'right')
+        counts = (b - a).astype(np.int64)
+        indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.arange(indptr[-1]) + np.repeat(a - indptr[:-1], counts)
+        A = sp.csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr),
+                          shape=(len(self.pruneEdges), len(self.segments)))
+        eids = np.array([edge.eid for edge in self.pruneEdges], dtype=np.int64)
+        sids = np.array([s.sid for s in self.segments], dtype=np.int64)
+        return A, eids, sids
+
+    def components(self, A=None):
+        '''Connected components of the ordering graph (edges linked to the segments
+           they cover) as lists of eids, sorted by the first eid.'''
+        from scipy.sparse import bmat
+        from scipy.sparse.csgraph import connected_components
+        if A is None:
+            A, eids, sids = self.incidence()
+        else:
+            eids = [edge.eid for edge in self.pruneEdges]
+        ncomp, labels = connected_components(bmat([[None, A], [A.T, None]]), directed=False)
+        C = {}
+        for eid, label in zip(eids, labels[:A.shape[0]]):
+            C.setdefault(label, []).append(int(eid))
+        return sorted([sorted(c) for c in C.values()])
+
+    def edge_overlaps(self, A=None):
+        '''Number of other prune edges sharing some segment with each edge (rows of A).'''
+        if A is None:
+            A = self.incidence()[0]
+        A = A.astype(np.int32)
+        return np.diff((A @ A.T).tocsr().indptr) - 1
+
+    def overlapping_pairs(self, A=None):
+        '''Pairs (a, b), a < b, of prune edges sharing some segment (the other pairs
+           commute).'''
+        if A is None:
+            A, eids, sids = self.incidence()
+        else:
+            eids = [edge.eid for edge in self.pruneEdges]
+        A = A.astype(np.int32)
+        B = (A @ A.T).tocoo()
+        for k, l in zip(B.row.tolist(), B.col.tolist()):
+            a, b = int(eids[k]), int(eids[l])
+            if a < b:
+                yield a, b
+
+    def structure_stats(self):
+        '''Structural statistics of the ordering graph computed from the incidence matrix:
+           number of components, size (edges, segments) of the largest one, histograms of
+           segments per edge (degE) and edges per segment (degS), and edge overlap counts.
+        '''
+        A = self.incidence()[0]
+        C = self.components(A)
+        largest = max(C, key=len) if C else []
+        segs = {sid for eid in largest for sid in self.E[eid].sid}
+        degE = np.diff(A.indptr)
+        degS = np.bincount(A.indices, minlength=A.shape[1])
+        return {'ncomp': len(C),
+                'largest': (len(largest), len(segs)),
+                'degE': np.bincount(degE),
+                'degS': np.bincount(degS),
+                'overlaps': self.edge_overlaps(A)}
+
+    def subinstance(self, eids):
+        '''NMR restricted to a component (eids, see components). It shares the edge and
+           segment objects of self, so it must not be updated. Its fnmr gets the suffix
+           _C<first eid> (files written by the solvers).
+        '''
+        sub = NMR.__new__(NMR)
+        sub.fnmr = self.fnmr.replace('.nmr', '_C%d.nmr' % min(eids))
+        sub.edges = []
+        sub.nnodes = self.nnodes
+        eids = set(eids)
+        sids = {sid for eid in eids for sid in self.E[eid].sid}
+        sub.pruneEdges = [edge for edge in self.pruneEdges if edge.eid in eids]
+        sub.segments = [s for s in self.segments if s.sid in sids]
+        sub.pruneArray = None
+        sub.E, sub.S = sub._ordering_data()
+        sub._build_index()
+        return sub
+
     def ordering_graph(self, use_weight=False):
+        '''networkx version of the ordering graph (segment vertices labeled 'i:j' and
+           edge vertices labeled by eid). Prefer incidence/components for large instances.'''
+        import networkx as nx
         G = nx.Graph()
         E, S = self.E, self.S
         
@@ -155,6 +671,55 @@ def order_cost(order, E, S, costUB=np.inf):
     return total_cost
 
 
+def order_cost_batch(nmr: NMR, orders, chunk_size=1 << 24):
+    '''Costs (as order_cost) of the orders given as the rows of a 2-D array of eids.
+       The first edge covering each segment is the one with the smallest position
+       among the edges covering it (min-reduction over the incidence matrix), and
+       each edge cost is 2**(sum of the log-weights of the segments it covers first).
+       chunk_size: maximum number of (order, incidence entry) pairs held in memory.
+    '''
+    orders = np.atleast_2d(np.asarray(orders, dtype=np.int64))
+    n, m = orders.shape
+    A, eids, sids = nmr.incidence()
+    A = A.tocsc()
+    # log2 of the weights of the segments (columns of A)
+    logw = np.array([nmr.S[sid].j - nmr.S[sid].i + 1 for sid in sids], dtype=np.int64)
+    # row of A of each eid
+    lut = np.full(max(eids.max(initial=0), orders.max(initial=0)) + 1, -1, dtype=np.int64)
+    lut[eids] = np.arange(len(eids))
+    K = lut[orders]
+    if (K < 0).any():
+        raise ValueError('Orders with eids that are not prune edges')
+    expo = np.zeros((n, m), dtype=np.int64)
+    step = max(1, chunk_size // max(1, A.nnz))
+    for r in range(0, n, step):
+        k = K[r:r + step]
+        nr = len(k)
+        # position of each edge in each order (m when it is not in the order)
+        pos = np.full((nr, len(eids)), m, dtype=np.int32)
+        pos[np.arange(nr)[:, None], k] = np.arange(m)
+        # position of the first edge covering each segment (every segment has some edge)
+        first = np.minimum.reduceat(pos[:, A.indices], A.indptr[:-1], axis=1)
+        flat = (first + (m + 1) * np.arange(nr)[:, None]).ravel()
+        X = np.bincount(flat, weights=np.tile(logw, nr), minlength=nr * (m + 1))
+        expo[r:r + nr] = X.reshape(nr, m + 1)[:, :m].astype(np.int64)
+    # edges covering no segment first cost zero (not one)
+    if m == 0:
+        return np.zeros(n, dtype=np.int64)
+    if expo.max() + int(np.ceil(np.log2(m))) < 63:
+        return np.where(expo > 0, np.left_shift(1, expo), 0).sum(axis=1)
+    # exact big integers: count the powers of two of each order and propagate the carries
+    L = int(expo.max()) + int(np.ceil(np.log2(m))) + 2
+    bits = np.zeros((n, L), dtype=np.int64)
+    rows, cols = np.nonzero(expo)
+    np.add.at(bits, (rows, expo[rows, cols]), 1)
+    for e in range(L - 1):
+        bits[:, e + 1] += bits[:, e] >> 1
+        bits[:, e] &= 1
+    data = np.packbits(bits.astype(np.uint8), axis=1, bitorder='little')
+    return np.array([int.from_bytes(row.tobytes(), 'little') for row in data], dtype=object)
+
+
 def order_sbbu(nmr):
     E = nmr.E
     order = list(E)  # list of edges eid
@@ -162,6 +727,49 @@ def order_sbbu(nmr):
     return order, order_cost(order, E, nmr.S)
 
 
+def write_order_pairs(fname, order, E):
+    '''Write the order as the atom pairs (i, j) of its edges, one per row.
+       Pairs do not depend on the eid numbering, so they can be mapped to a
+       related instance (e.g. the same protein with another dmax).'''
+    with open(fname, 'w') as fid:
+        for eid in order:
+            fid.write('%d %d\n' % (E[eid].i, E[eid].j))
+
+
+def read_order_pairs(fname):
+    with open(fname, 'r') as fid:
+        return [tuple(int(x) for x in row.split()[:2]) for row in fid if row.strip()]
+
+
+def order_warm_start(nmr: NMR, pairs):
+    '''Map an order of a related instance, given by atom pairs (i, j), to the eids of nmr.
+       Pairs not in nmr are dropped. Each edge of nmr not in pairs is inserted right
+       before the first mapped edge with a larger SBBU key (j, i), so the order of
+       an instance sorted by SBBU is kept.
+    '''
+    E = nmr.E
+    def key(eid): return (E[eid].j, E[eid].i)
+    eidIJ = {(E[eid].i, E[eid].j): eid for eid in E}
+    order = [eidIJ[ij] for ij in pairs if ij in eidIJ]
+    mapped = set(order)
+    # K[k]: largest key among order[:k+1] (non-decreasing, so it can be bisected)
+    K, kmax = [], None
+    for eid in order:
+        kmax = key(eid) if kmax is None else max(kmax, key(eid))
+        K.append(kmax)
+    # insert[k]: missing edges to be placed before order[k]
+    insert = {}
+    for eid in sorted([eid for eid in E if eid not in mapped], key=key):
+        k = bisect_right(K, key(eid))
+        insert.setdefault(k, []).append(eid)
+    warm = []
+    for k in range(len(order) + 1):
+        warm += insert.get(k, [])
+        if k < len(order):
+            warm.append(order[k])
+    return warm, order_cost(warm, E, nmr.S)
+
+
 def order_brute(nmr: NMR):
     '''Evaluate all posible permutations.'''
     E, S = nmr.E, nmr.S
@@ -174,7 +782,110 @@ def order_brute(nmr: NMR):
     return orderOPT, costOPT
 
 
+def brute_search(E, S, prefix=(), costUB=np.inf, costLB=-1, shared=None):
+    '''Exhaustive DFS over all orders of E starting with prefix.
+       The coverage and the cost of the common prefixes are shared, being updated
+       incrementally when an edge is added/removed. Since partial costs never decrease,
+       branches whose partial cost reaches costUB are skipped.
+       The search stops as soon as an order with cost <= costLB (certified optimum) is found.
+       shared: optional SharedBound with the best cost among all workers, read every
+               SHARED_POLL nodes (the lock is not taken at each node).
+       Returns the best order strictly cheaper than costUB (None if there is none) and its cost.
+    '''
+    # C[sid]: number of edges in the current order covering sid
+    C = {sid: 0 for sid in S}
+    order, best = [], [None, costUB]
+    # ext: number of nodes visited and last value read from shared
+    ext = [0, np.inf if shared is None else shared.get()]
+
+    def add(eid):
+        eid_cost = 1
+        for sid in E[eid].sid:
+            if sid in C:
+                C[sid] += 1
+                if C[sid] == 1:
+                    eid_cost *= S[sid].weight
+        return eid_cost if eid_cost > 1 else 0
+
+    def rem(eid):
+        for sid in E[eid].sid:
+            if sid in C:
+                C[sid] -= 1
+
+    def dfs(R, cost):
+        # R: edges not in the order yet
+        if shared is not None:
+            ext[0] += 1
+            if ext[0] % SHARED_POLL == 0:
+                ext[1] = shared.get()
+        if cost >= best[1] or cost >= ext[1]:
+            return False
+        if len(R) == 0:
+            best[0], best[1] = order.copy(), cost
+            if shared is not None:
+                shared.put(cost)
+            return cost <= costLB
+        for k, eid in enumerate(R):
+            order.append(eid)
+            stop = dfs(R[:k] + R[k+1:], cost + add(eid))
+            rem(eid)
+            order.pop()
+            if stop:
+                return True
+        return False
+
+    cost = 0
+    for eid in prefix:
+        order.append(eid)
+        cost += add(eid)
+    dfs([eid for eid in E if eid not in prefix], cost)
+    return best[0], best[1]
+
+
+# instance shared by the brute_search workers (set by _brute_init)
+_BRUTE = {}
+
+
+def _brute_init(E, S, costLB, shared):
+    _BRUTE['E'], _BRUTE['S'], _BRUTE['costLB'], _BRUTE['shared'] = E, S, costLB, shared
+
+
+def _brute_task(args):
+    prefix, costUB = args
+    return brute_search(_BRUTE['E'], _BRUTE['S'], prefix, costUB, _BRUTE['costLB'], _BRUTE['shared'])
+
+
+def order_brute_dfs(nmr: NMR, nproc=1, depth=2, stop=True):
+    '''Exact brute force with prefix sharing (see brute_search).
+       nproc: number of processes; the orders are split by their first 'depth' edges.
+       stop: stop at the first order whose cost reaches cost_relax (certified optimum).
+    '''
+    E, S = nmr.E, nmr.S
+    # initial incumbent
+    orderOPT, costOPT = order_sbbu(nmr)
+    costLB = cost_relax(S, S) if stop else -1
+    if costOPT <= costLB:
+        return orderOPT, costOPT
+    if nproc <= 1:
+        order, cost = brute_search(E, S, (), costOPT, costLB)
+        return (order, cost) if order is not None else (orderOPT, costOPT)
+    tasks = [(prefix, costOPT) for prefix in permutations(E, min(depth, len(E)))]
+    # best cost found so far by any worker (each one returns the order of its best cost)
+    import multiprocessing as mp
+    shared = SharedBound()
+    shared.put(costOPT)
+    with mp.Pool(nproc, initializer=_brute_init, initargs=(E, S, costLB, shared)) as pool:
+        for order, cost in pool.imap_unordered(_brute_task, tasks):
+            if order is not None and cost < costOPT:
+                orderOPT, costOPT = order, cost
+                if costOPT <= costLB:
+                    pool.terminate()
+                    break
+    return orderOPT, costOPT
+
+
 def order_greedy(nmr:NMR):
+    import copy
     E, S = copy.deepcopy(nmr.E), copy.deepcopy(nmr.S)
     order = []
     while len(E) > 0:
@@ -196,6 +907,100 @@ def order_greedy(nmr:NMR):
 
 
 
+# largest number of edges accepted by order_dp (the tables have 2**nedges entries)
+DP_MAX_EDGES = 25
+
+
+def order_dp(nmr: NMR, useUB=True, max_edges=DP_MAX_EDGES):
+    '''Exact dynamic programming over subsets of edges (Held-Karp like).
+       The cost of an edge depends only on the set of edges placed before it, so
+       f[mask] = min_{e in mask} f[mask - e] + cost(e | cover(mask - e)),
+       where cover(mask) is the union of the segments of the edges in mask.
+       The value table f is filled by popcount layers with NumPy; states whose
+       f + cost_relax(uncovered) reaches the order_sbbu cost are dropped when useUB.
+    '''
+    E, S = nmr.E, nmr.S
+    eids = list(E)
+    n = len(eids)
+    if n > max_edges:
+        raise ValueError('order_dp: %d edges (max_edges=%d)' % (n, max_edges))
+    orderUB, costUB = order_sbbu(nmr) if useUB else (None, np.inf)
+    # local index of the segments
+    sids = sorted(set(sid for eid in eids for sid in E[eid].sid if sid in S))
+    if len(sids) > 64:
+        raise ValueError('order_dp: %d segments (max 64)' % len(sids))
+    kS = {sid: k for k, sid in enumerate(sids)}
+    logw = [int(S[sid].j - S[sid].i + 1) for sid in sids]
+    bits = [[kS[sid] for sid in E[eid].sid if sid in kS] for eid in eids]
+    # Exact integer arithmetic: int64 when the costs that matter fit on it, Python int
+    # otherwise. Edge costs are capped at CAP, since with useUB any value >= costUB is dropped
+    # (f of the reached states is below CAP, so f + cost < 2**63).
+    CAP = min(sum(2**sum(logw[k] for k in b) for b in bits), costUB)
+    dtype = np.int64 if CAP < 2**62 else object
+
+    nmasks = 1 << n
+    # cover[mask] and popcount[mask] built by doubling
+    cover = np.zeros(nmasks, dtype=np.uint64)
+    popcnt = np.zeros(nmasks, dtype=np.int8)
+    for b in range(n):
+        emask = np.uint64(sum(1 << k for k in bits[b]))
+        cover[(1 << b):(2 << b)] = cover[:(1 << b)] | emask
+        popcnt[(1 << b):(2 << b)] = popcnt[:(1 << b)] + 1
+    # f[mask] is valid only when reached[mask] (no sentinel value: costs are unbounded)
+    f = np.zeros(nmasks, dtype=dtype)
+    reached = np.zeros(nmasks, dtype=bool)
+    reached[0] = True
+    # choice[mask]: last edge (local index) of the best order of mask
+    choice = np.full(nmasks, -1, dtype=np.int8)
+    totalW = sum(2**w for w in logw)
+
+    def relax(M):
+        # sum of the weights of the segments not covered by the masks M
+        covW = np.zeros(len(M), dtype=dtype)
+        for k in range(len(sids)):
+            covered = ((cover[M] >> np.uint64(k)) & np.uint64(1)).astype(bool)
+            covW[covered] += 2**logw[k]
+        return totalW - covW
+
+    for layer in range(1, n + 1):
+        M = np.nonzero(popcnt == layer)[0]
+        for b in range(n):
+            sub = M[(M >> b) & 1 == 1]
+            prev = sub ^ (1 << b)
+            sub, prev = sub[reached[prev]], prev[reached[prev]]
+            # exponent of the cost of edge b after the edges in prev
+            expo = np.zeros(len(prev), dtype=np.int64)
+            for k in bits[b]:
+                uncovered = ((cover[prev] >> np.uint64(k)) & np.uint64(1)) == 0
+                expo[uncovered] += logw[k]
+            if dtype is object:
+                cost = np.array([(1 << int(x)) if x > 0 else 0 for x in expo], dtype=object)
+            else:
+                cost = np.left_shift(1, np.minimum(expo, 62))
+                cost = np.where(expo > 0, np.minimum(cost, CAP), 0)
+            cand = f[prev] + cost
+            better = ~reached[sub] | (cand < f[sub])
+            f[sub[better]] = cand[better]
+            choice[sub[better]] = b
+            reached[sub[better]] = True
+        if useUB:
+            M = M[reached[M]]
+            dead = f[M] + relax(M) >= costUB
+            reached[M[dead]] = False
+
+    full = nmasks - 1
+    if not reached[full]:
+        # no order strictly cheaper than the upper bound
+        return orderUB, costUB
+    order, mask = [], full
+    while mask > 0:
+        b = int(choice[mask])
+        order.append(eids[b])
+        mask ^= 1 << b
+    order.reverse()
+    return order, int(f[full])
+
+
 def cost_relax(U, S):
     total_cost = 0
     for sid in U:
@@ -203,22 +1008,226 @@ def cost_relax(U, S):
     return total_cost
 
 
+def class_weights(nmr: NMR):
+    '''Product of the weights of each class of segments covered by the same edges
+       (frozenset of eids), always paid together.'''
+    P = {}
+    for sid in sorted(nmr.S):
+        X = frozenset(nmr.S[sid].eid)
+        P[X] = P.get(X, 1) * nmr.S[sid].weight
+    return P
+
+
+def pairwise_costs(nmr: NMR, pred=None):
+    '''Sparse pairwise interaction of the prune edges: for each pair (a, b), a < b, of
+       edges sharing some segment (see NMR.overlapping_pairs), D[a, b] = (ab, ba, own).
+       With the forced precedences pred, the first edge of a class of segments (see
+       class_weights) is one of its minimal edges: a class is owned by a when a is its
+       only minimal edge, and shared by a and b when they are its two minimal ones (it
+       goes with the first of them). ab and ba are the costs of the classes owned by a or
+       b and shared by them when a goes before b and when b goes before a, own is the sum
+       of their class products (what relax_weights counts).
+    '''
+    if pred is None:
+        pred = forced_precedences(nmr)
+    # Q[eid], Qsum[eid]: product and sum of the classes owned by eid, same for the shared ones
+    Q, Qsum, Pab, Psum = {}, {}, {}, {}
+    for X, weight in class_weights(nmr).items():
+        M = sorted(eid for eid in X if not pred[eid] & X)
+        if len(M) == 1:
+            Q[M[0]] = Q.get(M[0], 1) * weight
+            Qsum[M[0]] = Qsum.get(M[0], 0) + weight
+        elif len(M) == 2:
+            Pab[tuple(M)] = Pab.get(tuple(M), 1) * weight
+            Psum[tuple(M)] = Psum.get(tuple(M), 0) + weight
+
+    def join(x, y):
+        # cost of an edge paying the classes of products x and y (0: no class)
+        return x * y if x > 0 and y > 0 else x + y
+
+    D = {}
+    for a, b in nmr.overlapping_pairs():
+        qa, qb, w = Q.get(a, 0), Q.get(b, 0), Pab.get((a, b), 0)
+        own = Qsum.get(a, 0) + Qsum.get(b, 0) + Psum.get((a, b), 0)
+        D[a, b] = (join(qa, w) + qb, qa + join(qb, w), own)
+    return D
+
+
+def pairwise_increments(nmr: NMR, D=None):
+    '''Increments of the class bound (relax_weights) from the pairwise costs D: while a
+       and b are both unplaced, their classes cost at least min(ab, ba) instead of own
+       (see pairwise_costs). The pairs are taken greedily by increment, each edge in one
+       pair at most, so the increments add up. Valid for the orders that respect the
+       forced precedences. Returns a list of (a, b, increment), largest first.
+    '''
+    if D is None:
+        D = pairwise_costs(nmr)
+    inc = sorted(((min(ab, ba) - own, a, b) for (a, b), (ab, ba, own) in D.items() if min(ab, ba) > own), reverse=True)
+    pairs, used = [], set()
+    for d, a, b in inc:
+        if a not in used and b not in used:
+            used.update((a, b))
+            pairs.append((a, b, d))
+    return pairs
+
+
+def forced_precedences(nmr: NMR, pairs=None):
+    '''Precedences that never make an order worse: a goes before b when the segments of a
+       are a subset of the ones of b (ties by eid). Moving a just before b changes the
+       cost x*y of b to x + y, whatever the other edges (pairwise_costs compares a and b
+       alone, the other edges may reverse its answer). pairs: overlapping pairs of
+       edges (see NMR.overlapping_pairs), the others have no such relation.
+       Returns pred[eid], the edges forced before eid.
+    '''
+    if pairs is None:
+        pairs = nmr.overlapping_pairs()
+    pred = {eid: set() for eid in nmr.E}
+    for a, b in pairs:
+        sa, sb = nmr.E[a].sid, nmr.E[b].sid
+        if sa <= sb:
+            pred[b].add(a)
+        elif sb < sa:
+            pred[a].add(b)
+    return {eid: frozenset(pred[eid]) for eid in pred}
+
+
+def relax_weights(nmr: NMR):
+    '''Weights of a lower bound of the cost of the uncovered segments finer than cost_relax:
+       the segments covered by the same edges are always paid together (product of their
+       weights). The first segment of each such class gets the product, the others zero.
+    '''
+    classes = {}
+    for sid in sorted(nmr.S):
+        classes.setdefault(frozenset(nmr.S[sid].eid), []).append(sid)
+    W = {}
+    for sids in classes.values():
+        W[sids[0]] = int(np.prod([nmr.S[sid].weight for sid in sids], dtype=object))
+        for sid in sids[1:]:
+            W[sid] = 0
+    return W
+
+
+# number of search iterations between two reads of a SharedBound
+SHARED_POLL = 256
+
+
+class SharedBound:
+    '''Best cost shared by solvers running in different processes and a stop flag.
+       The cost is stored as a float: it is exact below 2**53 and get() rounds it up
+       above, so pruning with it never discards an order cheaper than the best one
+       found by any solver.
+    '''
+
+    def __init__(self, ctx=None) -> None:
+        '''ctx: multiprocessing context (default: multiprocessing).'''
+        if ctx is None:
+            import multiprocessing as ctx
+        self.value = ctx.Value('d', np.inf)
+        self.event = ctx.Event()
+
+    def put(self, cost):
+        with self.value.get_lock():
+            if cost < self.value.value:
+                self.value.value = float(cost)
+
+    def get(self):
+        value = self.value.value
+        if value == np.inf:
+            return np.inf
+        if value < 2**53:
+            return int(value)
+        return int(np.ceil(np.nextafter(value, np.inf)))
+
+    def stop(self):
+        self.event.set()
+
+    def stopped(self):
+        return self.event.is_set()
+
+
+TRACE_MAGIC = 0x42425452
+# one record per search event; costs are stored as float64 (approximate when huge)
+TRACE_DTYPE = np.dtype([('depth', '<i4'), ('id', '<i4'), ('cost', '<f8'), ('lb', '<f8'), ('action', 'u1')])
+# action of each record
+TRACE_ACTIONS = ('branch', 'prune', 'incumbent', 'skip')
+TRACE_BRANCH, TRACE_PRUNE, TRACE_INCUMBENT, TRACE_SKIP = range(4)
+TRACE_KINDS = ('BB', 'PT')
+
+
+class TraceWriter:
+    '''Binary trace of a search: one TRACE_DTYPE record (depth, eid, partial cost, lower
+       bound, action) per event, written in blocks of buffer_size records.
+       Actions: branch (node expanded), prune (bound reached the incumbent), incumbent
+       (improving order, the first one at depth -1 is the initial solution) and skip
+       (node discarded without the bound, partial-order reduction or nogood).
+    '''
+
+    def __init__(self, fname, kind='BB', buffer_size=1 << 16) -> None:
+        self.fname = fname
+        self.buffer = []
+        self.buffer_size = buffer_size
+        self.fid = open(fname, 'wb')
+        np.array([TRACE_MAGIC, 1, TRACE_KINDS.index(kind), 0], dtype=np.int32).tofile(self.fid)
+
+    def add(self, depth, eid, cost, lb, action):
+        self.buffer.append((depth, eid, cost, lb, action))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        try:
+            A = np.array(self.buffer, dtype=TRACE_DTYPE)
+        except OverflowError:
+            # costs beyond the float64 range
+            A = np.array([(depth, eid, min(cost, np.finfo('f8').max), min(lb, np.finfo('f8').max), action)
+                          for depth, eid, cost, lb, action in self.buffer], dtype=TRACE_DTYPE)
+        A.tofile(self.fid)
+        self.buffer = []
+
+    def close(self):
+        if not self.fid.closed:
+            self.flush()
+            self.fid.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_trace(fname):
+    '''Returns the kind of search ('BB' or 'PT') and the records of a trace file.'''
+    header = np.fromfile(fname, dtype=np.int32, count=4)
+    if len(header) < 4 or header[0] != TRACE_MAGIC:
+        raise ValueError('%s is not a trace file' % fname)
+    return TRACE_KINDS[header[2]], np.fromfile(fname, dtype=TRACE_DTYPE, offset=header.nbytes)
+
+
 class BBPerm:
-    def __init__(self, keys) -> None:
+    def __init__(self, keys, rank=None) -> None:
+        '''rank: dict key -> branching rank, the children of each node are visited
+                 in increasing rank (default: increasing key).
+        '''
         self.keys = list(keys)
+        if rank is None:
+            rank = {key: key for key in self.keys}
+        self.rank = rank
+        # key of each rank
+        self.key = {rank[key]: key for key in self.keys}
         # index of the element last element inserted
         self.idx = -1
         # current order
         self.order = np.zeros(len(keys), dtype=int)
-        # heap of available items
-        self.h = [key for key in keys]
+        # heap of the ranks of the available items
+        self.h = [rank[key] for key in self.keys]
         heapify(self.h)
         self.state = 'n'  # n:normal, p:prune
 
     def next(self):
         if self.state == 'n':
             if len(self.h) > 0:
-                emin = heappop(self.h)
+                emin = self.key[heappop(self.h)]
                 self.idx += 1
                 self.order[self.idx] = emin
                 return emin
@@ -228,7 +1237,7 @@ class BBPerm:
         if self.idx == -1:
             return None
         emin = self.minGT(self.order[self.idx])
-        heappush(self.h, self.order[self.idx])
+        heappush(self.h, self.rank[self.order[self.idx]])
         if emin is None:
             # set invalid value
             self.order[self.idx] = -1
@@ -239,24 +1248,32 @@ class BBPerm:
         return emin
 
     def minGT(self, elem):
-        # returns the smallest element bigger than elem
+        # returns the available element with the smallest rank bigger than the rank of elem
         if len(self.h) == 0:
             return None
+        relem = self.rank[elem]
         self.buffer = []
         while len(self.h) > 0:
             item = heappop(self.h)
-            if item > elem:
+            if item > relem:
                 break
             self.buffer.append(item)
         # restore elements on buffer
         for e in self.buffer:
             heappush(self.h, e)
-        return item if item > elem else None
+        return self.key[item] if item > relem else None
 
     def prune(self):
         self.state = 'p'
 
-    def start_from(self, idx, order):
+    def start_from(self, idx, order, add=None):
+        '''Continue the search below order[:idx+1] (the next call to next() returns
+           the sibling after order[idx]). add(k, key) is called for the keys of the
+           path but the last one (k: level).
+        '''
+        if add is not None:
+            for k in range(idx):
+                add(k, order[k])
         self.idx = idx
         self.order[:(idx+1)] = order[:(idx+1)]
         self.state = 'n'
@@ -264,18 +1281,169 @@ class BBPerm:
         self.h = []
         for e in self.keys:
             if e not in S:
-                heappush(self.h, e)
+                heappush(self.h, self.rank[e])
+
+
+class BBPermDynamic(BBPerm):
+    '''BBPerm where the children of each node are sorted when the node is expanded
+       by cost(key), evaluated on the current state of the search (ties by key).
+    '''
+
+    def __init__(self, keys, cost) -> None:
+        self.keys = sorted(keys)
+        self.cost = cost
+        self.idx = -1
+        self.order = np.zeros(len(keys), dtype=int)
+        # children[i]: sorted candidates at level i and pos[i] the current one
+        self.children = [None for _ in self.keys]
+        self.pos = np.zeros(len(keys), dtype=int)
+        self.used = set()
+        self.state = 'n'
+
+    def next(self):
+        if self.state == 'n':
+            if self.idx < len(self.keys) - 1:
+                self.idx += 1
+                self._expand()
+                self.pos[self.idx] = 0
+                return self._set(self.children[self.idx][0])
+            self.state = 'p'
+            return self.next()
+        # self.state == 'p'
+        if self.idx == -1:
+            return None
+        self.used.remove(self.order[self.idx])
+        self.pos[self.idx] += 1
+        if self.pos[self.idx] == len(self.children[self.idx]):
+            # set invalid value
+            self.order[self.idx] = -1
+            self.idx -= 1
+            return self.next()
+        self.state = 'n'
+        return self._set(self.children[self.idx][self.pos[self.idx]])
+
+    def _expand(self):
+        free = [key for key in self.keys if key not in self.used]
+        self.children[self.idx] = sorted(free, key=lambda key: (self.cost(key), key))
+
+    def _set(self, key):
+        self.order[self.idx] = key
+        self.used.add(key)
+        return key
+
+    def start_from(self, idx, order, add=None):
+        '''See BBPerm.start_from. The children of each level of the path are sorted
+           again, so add must update the state read by cost.
+        '''
+        self.used = set()
+        self.state = 'n'
+        for k in range(idx + 1):
+            self.idx = k
+            self._expand()
+            self.pos[k] = self.children[k].index(order[k])
+            self._set(order[k])
+            if k < idx and add is not None:
+                add(k, order[k])
+
+
+# number of nodes between two checks of the time limit in the inner loops of BB
+TIME_POLL = 256
+# estimated size (bytes) of a node stored by BB.solve_best_first, plus 8 per sid covered
+BF_NODE_BYTES = 96
+BF_MAX_MEMORY = 1 << 28
+
+BB_BRANCHING = ('eid', 'sbbu', 'greedy', 'segments', 'cheapest')
 
 
 class BB:
-    def __init__(self, nmr: NMR) -> None:
+    def __init__(self, nmr: NMR, branching='eid', por=True, pairwise=False) -> None:
+        '''branching: order of the children of each node
+              eid: increasing eid (file order)
+              sbbu, greedy: position in the order given by order_sbbu or order_greedy
+              segments: most covered segments first
+              cheapest: cheapest edge to add at the node (dynamic)
+           por: partial-order reduction, only one interleaving of the edges that cover
+                disjoint segments (commuting edges) is explored (see redundant).
+           pairwise: solve skips the orders against the forced precedences and bounds
+                     with relax_weights plus the pairwise increments instead of cost_relax.
+        '''
         self.nmr = nmr
         self.E, self.S = nmr.E, nmr.S
         self.nedges = len(self.E)
         self.idx = -1
-        self.perm = BBPerm(nmr.E)
+        self.branching = branching
+        self.perm = self.branching_perm(branching)
         self.order = np.zeros(self.nedges, dtype=int)
         self.timeout = False
+        # number of nodes visited by the last search
+        self.nodes = 0
+        self.por = por
+        # canonical order of the commuting edges: the branching rank when it is static,
+        # otherwise the greedy order (close to the cheapest-first choices)
+        if branching != 'cheapest':
+            self.rank = self.perm.rank
+        elif por:
+            self.rank = {int(eid): k for k, eid in enumerate(order_greedy(nmr)[0])}
+        # N[eid]: edges sharing some segment with eid (the others commute with it)
+        self.N = {eid: set() for eid in self.E}
+        if por:
+            for sid in self.S:
+                for eid in self.S[sid].eid:
+                    self.N[eid].update(self.S[sid].eid)
+        self.pairwise = pairwise
+        # pred[eid]: edges forced before eid; W: weights of the bound (see relax)
+        self.pred = forced_precedences(nmr) if pairwise else None
+        self.W = relax_weights(nmr) if pairwise else None
+        # pairs[k] = (a, b, increment of the bound while a and b are unplaced)
+        self.pairs = pairwise_increments(nmr, pairwise_costs(nmr, self.pred)) if pairwise else None
+        # edges in the current order
+        self.placed = set()
+
+    def redundant(self, idx):
+        '''True when the edge at self.order[idx] commutes with a block of edges just before
+           it that contains one of bigger rank. Swapping commuting neighbours does not change
+           the cost, so only the orders without such blocks (one per class) are explored.
+        '''
+        eid = self.order[idx]
+        N, rank = self.N[eid], self.rank[eid]
+        for k in range(idx - 1, -1, -1):
+            if self.order[k] in N:
+                return False
+            if self.rank[self.order[k]] > rank:
+                return True
+        return False
+
+    def branching_perm(self, branching):
+        E = self.E
+        if branching == 'eid':
+            return BBPerm(E)
+        if branching in ('sbbu', 'greedy'):
+            order = order_sbbu(self.nmr)[0] if branching == 'sbbu' else order_greedy(self.nmr)[0]
+            return BBPerm(E, {int(eid): k for k, eid in enumerate(order)})
+        if branching == 'segments':
+            order = sorted(E, key=lambda eid: (-len(E[eid].sid), eid))
+            return BBPerm(E, {eid: k for k, eid in enumerate(order)})
+        if branching == 'cheapest':
+            return BBPermDynamic(E, self.add_cost)
+        raise ValueError('Unknown branching %s (options: %s)' % (branching, ', '.join(BB_BRANCHING)))
+
+    def add_cost(self, eid):
+        '''Cost of adding eid to the current order (self.C).'''
+        eid_cost = 1
+        for sid in self.E[eid].sid:
+            if self.C[sid] == 0:
+                eid_cost *= self.S[sid].weight
+        return eid_cost if eid_cost > 1 else 0
+
+    def relax(self, U):
+        '''Lower bound of the cost of covering the segments U.'''
+        if self.W is None:
+            return cost_relax(U, self.S)
+        costLB = sum(self.W[sid] for sid in U)
+        for a, b, inc in self.pairs:
+            if a not in self.placed and b not in self.placed:
+                costLB += inc
+        return costLB
 
     def order_rem(self, C, U):
         # Returns the total_cost of the eids removed from self.order
@@ -286,6 +1454,7 @@ class BB:
             eid = self.order[idx]
             # set invalid value
             self.order[idx] = -1
+            self.placed.discard(eid)
             eid_cost = 1
             for sid in self.E[eid].sid:
                 C[sid] -= 1
@@ -303,6 +1472,7 @@ class BB:
             U: set of the uncovered segments.
         '''
         self.order[self.perm.idx] = eid
+        self.placed.add(eid)
         eid_cost = 1
         for sid in self.E[eid].sid:
             C[sid] += 1
@@ -312,81 +1482,468 @@ class BB:
                 U.remove(sid)
         return eid_cost if eid_cost > 1 else 0
 
-    def load(self):
+    def load(self, C, U):
+        '''Restore the state saved by dump: best order, costUB and the current path of
+           the search. The edges of the path but the last one are added to the order
+           (updating C and U) and perm continues below the last one.
+           Returns the partial cost of the added edges and the last edge of the path.
+        '''
+        import pickle
         fname = self.nmr.fnmr.replace('.nmr', '.pkl')
         print('> unpicliking', fname)
         with open(fname, 'rb') as fid:
             data = pickle.load(fid)
-        self.idx = data['idx']
-        self.order = data['order']
+        if data['eids'] != sorted(self.E) or data['branching'] != self.branching:
+            raise ValueError('The state %s does not match the instance %s' % (fname, self.nmr.fnmr))
         self.orderOPT = data['orderOPT']
         self.costUB = data['costUB']
-        C, U = data['C'], data['U']
-        return C, U
+        path = data['path']
+        partial_cost = 0
 
-    def dump(self, C, U):
+        def add(idx, eid):
+            nonlocal partial_cost
+            self.perm.idx = idx
+            partial_cost += self.order_add(eid, C, U)
+
+        self.perm.start_from(len(path) - 1, np.array(path), add)
+        self.idx = len(path) - 2
+        return partial_cost, path[-1]
+
+    def dump(self):
+        '''Save the best order, costUB and the current path of the search (see load).'''
+        import pickle
         fname = self.nmr.fnmr.replace('.nmr', '.pkl')
         print('> picliking', fname)
         data = {}
-        data['idx'] = self.idx
-        data['order'] = self.order
+        data['eids'] = sorted(self.E)
+        data['branching'] = self.branching
+        data['path'] = [int(eid) for eid in self.perm.order[:(self.perm.idx+1)]]
         data['orderOPT'] = self.orderOPT
         data['costUB'] = self.costUB
-        data['U'] = U
-        data['C'] = C
         with open(fname, 'wb') as fid:
             pickle.dump(data, fid)
 
-    def solve(self, unpickling=False, tmax=60):
+    def solve(self, unpickling=False, tmax=60, warm=None, callback=None, shared=None, trace=None, dump=False):
+        '''warm: order of a related instance as atom pairs (see order_warm_start),
+                 used as the initial solution when it is better than SBBU.
+           callback: called as callback(order, cost, elapsed, lower_bound) for the initial
+                     and each improving solution; the search stops when it returns True.
+           shared: SharedBound exchanging the best cost with other solvers (see solve_portfolio).
+           trace: TraceWriter recording the search events (closed by the caller).
+           unpickling: resume the search saved on the last timeout (tmax counts the time
+                       of this call only).
+           dump: save the state of the search on timeout (see dump), next to the instance.
+        '''
+        for incumbent in self.iter_solve(unpickling, tmax, warm, shared, trace, dump):
+            if callback is not None and callback(*incumbent):
+                break
+        return self.orderOPT, self.costUB
+
+    def iter_solve(self, unpickling=False, tmax=60, warm=None, shared=None, trace=None, dump=False):
+        '''Anytime version of solve: yields (order, cost, elapsed, lower_bound) for the
+           initial and each improving solution as soon as it is found. Closing the
+           generator (e.g. leaving the consuming loop) stops the search.
+           self.costLB is set to the optimal cost when the search is completed.
+        '''
         tic = time.time()
-        if unpickling:
-            self.load()
-        else:
-            # initial optimal solution
-            self.orderOPT, self.costUB = order_sbbu(self.nmr)
+        # time when the current best solution was found
+        self.time_best = 0
+        # costEXT: best cost found by the other solvers sharing the bound
+        costEXT = np.inf
+        self.stopped = False
+        self.nodes = 0
 
         # C[sid] : number of edges already included in the order that cover segment sid
-        C = {sid: 0 for sid in self.S}
+        C = self.C = {sid: 0 for sid in self.S}
 
         # U: set of the uncovered segments
         U = set([sid for sid in C])
 
         # first cost_relax
-        costLB = cost_relax(U, self.S)
+        costLB = self.relax(U)
+        self.costLB = costLB
+
+        # eid: next edge to evaluate (the last one of the resumed path)
+        partial_cost, eid = 0, None
+        if unpickling:
+            partial_cost, eid = self.load(C, U)
+        else:
+            # initial optimal solution
+            self.orderOPT, self.costUB = order_sbbu(self.nmr)
+            if warm is not None:
+                orderWS, self.costWS = order_warm_start(self.nmr, warm)
+                if self.costWS < self.costUB:
+                    self.orderOPT, self.costUB = orderWS, self.costWS
+
+        if shared is not None:
+            shared.put(self.costUB)
+        if trace is not None:
+            trace.add(-1, -1, self.costUB, costLB, TRACE_INCUMBENT)
+        yield [int(eid) for eid in self.orderOPT], self.costUB, time.time() - tic, self.costLB
         if costLB == self.costUB:
-            return self.orderOPT, self.costUB
+            if shared is not None:
+                shared.stop()
+            return
 
-        partial_cost = 0
-        eid = self.perm.next()
+        if eid is None:
+            eid = self.perm.next()
         # loop through all permutations
         while eid is not None:
             partial_cost -= self.order_rem(C, U)
             partial_cost += self.order_add(eid, C, U)
             self.idx = self.perm.idx
             # when U is empty, the partial_cost is total.
-            costLB = partial_cost + cost_relax(U, self.S)
+            costLB = partial_cost + self.relax(U)
             toc = time.time() - tic
             if toc > tmax:
                 self.timeout = True
                 print('> timeoutBB %f seconds' % toc)
-                self.dump(C, U)
+                if dump:
+                    self.dump()
                 break
-            if costLB >= self.costUB:
+            self.nodes += 1
+            if shared is not None and self.nodes % SHARED_POLL == 0:
+                if shared.stopped():
+                    self.stopped = True
+                    break
+                costEXT = shared.get()
+            if costLB >= min(self.costUB, costEXT):
+                self.perm.prune()
+                if trace is not None:
+                    trace.add(self.perm.idx, eid, partial_cost, costLB, TRACE_PRUNE)
+            elif self.por and self.redundant(self.perm.idx):
+                self.perm.prune()
+                if trace is not None:
+                    trace.add(self.perm.idx, eid, partial_cost, costLB, TRACE_SKIP)
+            elif self.pairwise and not self.pred[eid] <= self.placed:
                 self.perm.prune()
+                if trace is not None:
+                    trace.add(self.perm.idx, eid, partial_cost, costLB, TRACE_SKIP)
             elif self.perm.idx == (self.nedges - 1) and costLB < self.costUB:
                 self.costUB = costLB
                 self.orderOPT[:] = self.order
+                self.time_best = toc
+                if shared is not None:
+                    shared.put(self.costUB)
+                if trace is not None:
+                    trace.add(self.perm.idx, eid, partial_cost, costLB, TRACE_INCUMBENT)
+                yield [int(eid) for eid in self.orderOPT], self.costUB, toc, self.costLB
+            elif trace is not None:
+                trace.add(self.perm.idx, eid, partial_cost, costLB, TRACE_BRANCH)
             eid = self.perm.next()
+        if not (self.timeout or self.stopped):
+            # no order is cheaper than the best one (own or shared)
+            self.costLB = min(self.costUB, costEXT)
+            if shared is not None:
+                shared.stop()
+
+    def child(self, eid, U):
+        '''Segments of U covered by eid, cost of adding eid and their total weight.'''
+        new = [sid for sid in self.E[eid].sid if sid in U]
+        eid_cost, weight = 1, 0
+        for sid in new:
+            eid_cost *= self.S[sid].weight
+            weight += self.S[sid].weight
+        return new, (eid_cost if eid_cost > 1 else 0), weight
+
+    def children(self, R, U):
+        '''Children (eid, new, cost, weight) of a node with remaining edges R and uncovered
+           segments U, cheapest first. An edge covering nothing new costs zero now and later,
+           so it is the only child when there is one.
+        '''
+        C = []
+        for eid in sorted(R):
+            new, eid_cost, weight = self.child(eid, U)
+            if len(new) == 0:
+                return [(eid, new, eid_cost, weight)]
+            C.append((eid, new, eid_cost, weight))
+        return sorted(C, key=lambda child: child[2])
+
+    def dfs(self, order, U, cost, tic, tmax):
+        '''DFS below the node (order, uncovered segments U, partial cost) with the bound
+           of solve_best_first, updating self.orderOPT and self.costUB.
+           Returns False if it stops by timeout.
+        '''
+        R = set(self.E).difference(order)
+        costU = cost_relax(U, self.S)
+        # stack[i]: children of the node at depth i not visited yet; path[i]: child taken
+        stack, path = [iter(self.children(R, U))], []
+        while len(stack) > 0:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                if len(path) > 0:
+                    eid, new, eid_cost, weight = path.pop()
+                    U.update(new)
+                    R.add(eid)
+                    order.pop()
+                    cost, costU = cost - eid_cost, costU + weight
+                continue
+            self.nodes += 1
+            if self.nodes % TIME_POLL == 0 and time.time() - tic > tmax:
+                return False
+            eid, new, eid_cost, weight = child
+            if cost + eid_cost + costU - weight >= self.costUB:
+                continue
+            if len(R) == 1:
+                self.costUB, self.orderOPT = cost + eid_cost, order + [eid]
+                self.time_best = time.time() - tic
+                continue
+            U.difference_update(new)
+            R.remove(eid)
+            order.append(eid)
+            cost, costU = cost + eid_cost, costU - weight
+            path.append(child)
+            stack.append(iter(self.children(R, U)))
+        return True
+
+    def solve_best_first(self, tmax=60, max_memory=BF_MAX_MEMORY):
+        '''Best-first search: the open nodes are kept in a heap keyed by their lower bound
+           (partial cost plus cost_relax of the uncovered segments). Each node is stored
+           as its parent, the eid added and the segments it covers first (coverage delta),
+           and its order and coverage are rebuilt from the root when it is expanded.
+           When the estimated memory of the stored nodes reaches max_memory (bytes), the
+           open nodes are solved by DFS in increasing lower bound order.
+           self.costLB is the smallest lower bound of the open nodes and self.gap the
+           proven optimality gap (costUB - costLB) / costUB, zero when not timed out.
+           self.memory is the estimated memory of the stored nodes (bytes) and self.hybrid
+           is True when the cap was reached (DFS below the open nodes).
+        '''
+        tic = time.time()
+        self.time_best, self.nodes, self.timeout = 0, 0, False
+        orderOPT, self.costUB = order_sbbu(self.nmr)
+        self.orderOPT = [int(eid) for eid in orderOPT]
+        # node k: parent[k], eids[k], delta[k] and partial[k] (cost of the order up to k)
+        parent, eids, delta, partial = [-1], [None], [()], [0]
+        memory = BF_NODE_BYTES
+        heap = [(cost_relax(self.S, self.S), 0)]
+        while len(heap) > 0 and heap[0][0] < self.costUB:
+            costLB, node = heappop(heap)
+            if time.time() - tic > tmax:
+                self.timeout = True
+                heappush(heap, (costLB, node))
+                print('> timeoutBB %f seconds' % (time.time() - tic))
+                break
+            # rebuild the order and the uncovered segments of the node
+            order, U, k = [], set(self.S), node
+            while k > 0:
+                order.append(eids[k])
+                U.difference_update(delta[k])
+                k = parent[k]
+            order.reverse()
+            cost = partial[node]
+            if memory >= max_memory:
+                if not self.dfs(order, U, cost, tic, tmax):
+                    self.timeout = True
+                    heappush(heap, (costLB, node))
+                    break
+                continue
+            R = set(self.E).difference(order)
+            costU = cost_relax(U, self.S)
+            for eid, new, eid_cost, weight in self.children(R, U):
+                self.nodes += 1
+                childLB = cost + eid_cost + costU - weight
+                if childLB >= self.costUB:
+                    continue
+                if len(R) == 1:
+                    self.costUB, self.orderOPT = childLB, order + [eid]
+                    self.time_best = time.time() - tic
+                    continue
+                parent.append(node)
+                eids.append(eid)
+                delta.append(tuple(new))
+                partial.append(cost + eid_cost)
+                memory += BF_NODE_BYTES + 8 * len(new)
+                heappush(heap, (childLB, len(parent) - 1))
+        self.memory, self.hybrid = memory, memory >= max_memory
+        self.costLB = min(heap[0][0], self.costUB) if len(heap) > 0 else self.costUB
+        self.gap = (self.costUB - self.costLB) / self.costUB if self.costUB > 0 else 0
         return self.orderOPT, self.costUB
 
+    def lds_children(self, R, U, rank, d, k):
+        '''Children (eid, new, cost, weight, discrepancies) of a node of solve_lds with
+           remaining edges R, uncovered segments U and d discrepancies, in increasing rank.
+           Taking a child but the first one is a discrepancy and only the children that
+           can still reach k discrepancies are kept (a level with r edges left adds at
+           most r - 1). An edge covering nothing new is the only child (see children).
+        '''
+        C = []
+        for eid in sorted(R, key=rank.get):
+            new, eid_cost, weight = self.child(eid, U)
+            if len(new) == 0:
+                C = [(eid, new, eid_cost, weight)]
+                break
+            C.append((eid, new, eid_cost, weight))
+        # discrepancies that the levels below the children can still add
+        room = max(len(R) - 2, 0)
+        children = []
+        if k - d <= room:
+            children.append(C[0] + (d,))
+        if d < k and k - d - 1 <= room:
+            children += [child + (d + 1,) for child in C[1:]]
+        return children
+
+    def lds(self, k, rank, tic, tmax, callback=None):
+        '''One iteration of solve_lds: DFS over the orders with exactly k discrepancies,
+           pruned with the bound of solve_best_first. Returns False if it stops by timeout
+           (or when callback returns True).
+        '''
+        order, U, R = [], set(self.S), set(self.E)
+        cost, costU = 0, cost_relax(U, self.S)
+        stack, path = [iter(self.lds_children(R, U, rank, 0, k))], []
+        while len(stack) > 0:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                if len(path) > 0:
+                    eid, new, eid_cost, weight, d = path.pop()
+                    U.update(new)
+                    R.add(eid)
+                    order.pop()
+                    cost, costU = cost - eid_cost, costU + weight
+                continue
+            self.nodes += 1
+            if self.nodes % TIME_POLL == 0 and time.time() - tic > tmax:
+                return False
+            eid, new, eid_cost, weight, d = child
+            if cost + eid_cost + costU - weight >= self.costUB:
+                continue
+            if len(R) == 1:
+                self.costUB, self.orderOPT = cost + eid_cost, order + [eid]
+                self.time_best = time.time() - tic
+                if callback is not None and callback(self.orderOPT, self.costUB, self.time_best, k):
+                    return False
+                continue
+            U.difference_update(new)
+            R.remove(eid)
+            order.append(eid)
+            cost, costU = cost + eid_cost, costU - weight
+            path.append(child)
+            stack.append(iter(self.lds_children(R, U, rank, d, k)))
+        return True
+
+    def solve_lds(self, tmax=60, heuristic='sbbu', callback=None):
+        '''Limited-discrepancy search around the order given by order_sbbu or order_greedy
+           (heuristic): the children of each node are ranked by the position of their edge
+           in that order. The iteration k searches the orders with exactly k discrepancies
+           (see lds_children), k = 0, 1, ..., so the orders close to the heuristic one are
+           visited first and the last iteration completes the search.
+           callback: called as callback(order, cost, elapsed, k) for the heuristic order and
+                     each improving one; the search stops when it returns True.
+           self.lds_k is the last completed iteration and self.costLB is set to the optimal
+           cost when all of them are completed.
+        '''
+        tic = time.time()
+        self.time_best, self.nodes, self.timeout = 0, 0, False
+        if heuristic == 'sbbu':
+            orderH, self.costUB = order_sbbu(self.nmr)
+        elif heuristic == 'greedy':
+            orderH, self.costUB = order_greedy(self.nmr)
+        else:
+            raise ValueError('Unknown heuristic %s (options: sbbu, greedy)' % heuristic)
+        self.orderOPT = [int(eid) for eid in orderH]
+        rank = {eid: k for k, eid in enumerate(self.orderOPT)}
+        self.costLB = cost_relax(self.S, self.S)
+        self.lds_k = -1
+        if callback is not None and callback(self.orderOPT, self.costUB, 0, -1):
+            return self.orderOPT, self.costUB
+        for k in range(self.nedges):
+            if self.costLB == self.costUB:
+                break
+            if not self.lds(k, rank, tic, tmax, callback):
+                self.timeout = time.time() - tic > tmax
+                if self.timeout:
+                    print('> timeoutBB %f seconds' % (time.time() - tic))
+                return self.orderOPT, self.costUB
+            self.lds_k = k
+        self.costLB = self.costUB
+        return self.orderOPT, self.costUB
+
+
+def max_rss(who='self'):
+    '''Maximum resident set size (MB) of the process (who='self') or of its largest
+       finished child process (who='children'); nan when it is not available.'''
+    if resource is None:
+        return np.nan
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # kilobytes on Linux, bytes on macOS
+    return usage.ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+class MemoryProbe:
+    '''Peak memory of each phase of a run: the Python allocations traced by tracemalloc
+       above the memory in use when the phase started, and the max RSS of the process
+       at its end. A disabled probe does nothing (tracemalloc slows down the solvers).
+    '''
+
+    def __init__(self, enabled=True) -> None:
+        self.enabled = enabled
+        # phases[name] = (peak allocation MB, max RSS MB)
+        self.phases = {}
+        # started: tracemalloc was started by this probe (and is stopped by close)
+        self.started = False
+        if enabled:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started = True
+
+    def start(self):
+        if self.enabled:
+            import tracemalloc
+            tracemalloc.reset_peak()
+            self.base = tracemalloc.get_traced_memory()[0]
+
+    def stop(self, name, who='self'):
+        if self.enabled:
+            import tracemalloc
+            peak = tracemalloc.get_traced_memory()[1] - self.base
+            self.phases[name] = (peak / (1 << 20), max_rss(who))
+
+    def write(self, fid):
+        for name, (peak, rss) in self.phases.items():
+            write_log(fid, '> %s %s %.3f' % ('mem%s (MB)' % name, '.' * (18 - len('mem%s (MB)' % name)), peak))
+            write_log(fid, '> %s %s %.3f' % ('rss%s (MB)' % name, '.' * (18 - len('rss%s (MB)' % name)), rss))
+
+    def close(self):
+        if self.started:
+            import tracemalloc
+            tracemalloc.stop()
+            self.started = False
+
 
 def write_log(fid, line):
     print(line)
     fid.write(line + '\n')
 
 
+# seconds between two checkpoints of PriorityTree
+CHECKPOINT_INTERVAL = 60
+# maximum number of entries of the nogood cache of PriorityTree
+NOGOOD_SIZE = 1 << 14
+# smallest subtree (nodes) whose state is added to the nogood cache
+NOGOOD_MIN_NODES = 8
+# rules choosing the segment of each level of PriorityTree (see select_segment)
+PT_SELECT = ('static', 'fewest', 'weight')
+
+
 class PriorityTree:
-    def __init__(self, nmr: NMR) -> None:
+    def __init__(self, nmr: NMR, nogood_size=NOGOOD_SIZE, pairwise=False, select='static') -> None:
+        '''nogood_size: maximum number of entries of the nogood cache (0 disables it).
+           pairwise: skip the assignments against the forced precedences and prune with
+                     the bound of the unassigned segments (see tail_bounds).
+           select: segment of each level (see select_segment)
+              static: the order ordS computed here
+              fewest: fewest available edges first (fail-first), ties by weight; a
+                      segment with a single available edge is taken at once
+              weight: heaviest segment first
+        '''
+        import networkx as nx
+        # networkx is imported here once, not in check_path (hot path)
+        self.nx = nx
+        if select not in PT_SELECT:
+            raise ValueError('Unknown select %s (options: %s)' % (select, ', '.join(PT_SELECT)))
+        self.select = select
         self.nmr = nmr
         self.E, self.S = nmr.E, nmr.S
         # sort edges by the number of segments
@@ -405,10 +1962,63 @@ class PriorityTree:
         # Ek: number of uncovered segments
         # When Ek is zero, we can calculate the cost of solving the edge eid
         self.Ek = {eid:len(self.E[eid].sid) for eid in self.E}
+        # freeW: total weight of the segments not assigned
+        self.freeW = cost_relax(self.S, self.S)
         # G: graph of priorities
-        self.G = nx.DiGraph()
+        self.G = self.nx.DiGraph()
+        # avail[sid]: available edges of sid in G, kept by add_precedence and backtracking
+        # for the fewest rule (None: not computed); avail_undo[level]: entries replaced at level
+        self.avail, self.avail_undo = None, {}
         self.order, self.cost = order_sbbu(self.nmr)
         self.timeout = False
+        # nogood[signature]: lower bound of the cost to complete the assignment (LRU)
+        self.nogood = OrderedDict()
+        self.nogood_size = nogood_size
+        self.nogood_hits = 0
+        # number of nogoods of each signature without the closure (cheap filter)
+        self.nogood_index = {}
+        # number of nodes visited by the last search
+        self.nodes = 0
+        self.pairwise = pairwise
+        # pred[eid]: edges forced before eid (see forced_precedences), fixed in G
+        self.pred = forced_precedences(nmr) if pairwise else None
+        self.add_forced()
+        self.tailW = self.tail_bounds() if pairwise else None
+
+    def add_forced(self):
+        '''Add the forced precedences to G (never removed by backtracking).'''
+        if self.pred is None:
+            return
+        for eid in self.pred:
+            self.G.add_edges_from((eid, eidA) for eidA in self.pred[eid])
+
+    def tail_bounds(self):
+        '''tailW[level]: lower bound of the cost of the segments ordS[level:] (see
+           relax_weights), a class of segments covered by the same edges counts as the
+           product of its weights when it is entirely unassigned, plus the increment of
+           each pair of edges with all their segments unassigned (see pairwise_increments).
+        '''
+        classes = {}
+        for level, sid in enumerate(self.ordS):
+            classes.setdefault(frozenset(self.S[sid].eid), []).append(level)
+        tailW = [0 for _ in range(len(self.ordS) + 1)]
+        for level in range(len(self.ordS) - 1, -1, -1):
+            sid = self.ordS[level]
+            levels = classes[frozenset(self.S[sid].eid)]
+            if level == levels[0]:
+                # the whole class is in the tail: product instead of the sum
+                weight = 1
+                for k in levels:
+                    weight *= self.S[self.ordS[k]].weight
+                tailW[level] = tailW[level + 1] + weight - sum(self.S[self.ordS[k]].weight for k in levels[1:])
+            else:
+                tailW[level] = tailW[level + 1] + self.S[sid].weight
+        levelS = {sid: level for level, sid in enumerate(self.ordS)}
+        for a, b, inc in pairwise_increments(self.nmr, pairwise_costs(self.nmr, self.pred)):
+            first = min(levelS[sid] for sid in self.E[a].sid | self.E[b].sid)
+            for level in range(first + 1):
+                tailW[level] += inc
+        return tailW
 
     def check_path(self, eidA, eidB):
         '''eidA: source
@@ -416,7 +2026,7 @@ class PriorityTree:
         '''
         try:
             # A > B 
-            pAB = nx.shortest_path(self.G, source=eidA, target=eidB)
+            pAB = self.nx.shortest_path(self.G, source=eidA, target=eidB)
         except:
             pAB = None
         return pAB is not None
@@ -437,15 +2047,57 @@ class PriorityTree:
                     C[eidB] = False
         return sorted([eid for eid in C if C[eid]])
 
-    def add_precedence(self, eidA, E):
+    def add_precedence(self, eidA, E, level=None):
         # eidA < eidB
         P = []
         for eidB in E:
             if (eidB != eidA) and (self.G.has_edge(eidB, eidA) == False):
                 self.G.add_edge(eidB, eidA)
                 P.append((eidB, eidA))
+        if self.avail is not None:
+            self.update_avail(level, P)
         return P
 
+    def update_avail(self, level, P):
+        '''Update self.avail after adding the precedences P = [(eidB, eidA), ...] (all to
+           the same eidA). An edge e of a segment becomes unavailable when it now reaches
+           another edge of the segment: e reaches some eidB and eidA reaches that edge.
+           The replaced entries are saved in self.avail_undo[level] (see restore_avail).
+        '''
+        undo = self.avail_undo[level] = []
+        if len(P) == 0:
+            return
+        eidA = P[0][1]
+        D = self.nx.descendants(self.G, eidA)
+        D.add(eidA)
+        # A: edges reaching some eidB (reverse BFS)
+        A = set(eidB for eidB, _ in P)
+        stack = list(A)
+        while len(stack) > 0:
+            for e in self.G.predecessors(stack.pop()):
+                if e not in A:
+                    A.add(e)
+                    stack.append(e)
+        for sid in set(sid for e in A for sid in self.E[e].sid):
+            X = self.S[sid].eid
+            if len(D.intersection(X)) == 0:
+                continue
+            avail = [e for e in self.avail[sid] if e not in A or len(D.intersection(X) - {e}) == 0]
+            if len(avail) < len(self.avail[sid]):
+                undo.append((sid, self.avail[sid]))
+                self.avail[sid] = avail
+
+    def restore_avail(self, level):
+        '''Undo update_avail of level (its precedences were removed from G).'''
+        if self.avail is None:
+            return
+        if level not in self.avail_undo:
+            # G was changed without update_avail (e.g. restored from a checkpoint)
+            self.avail = None
+            return
+        for sid, avail in reversed(self.avail_undo.pop(level)):
+            self.avail[sid] = avail
+
     def edge_cost(self, c_eid, eid, costUB):
         cost = 1
         for sid in self.E[eid].sid:
@@ -459,6 +2111,7 @@ class PriorityTree:
 
     def add_cost(self, sid, c_eid, costUB):
         cost = 0
+        self.freeW -= self.S[sid].weight
         for eid in self.S[sid].eid:
             if self.Ek[eid] == 0:
                 continue
@@ -470,24 +2123,92 @@ class PriorityTree:
     def rem_cost(self, i, sid, costADD):
         costREM = costADD[i]
         costADD[i] = 0
+        self.freeW += self.S[sid].weight
         for eid in self.S[sid].eid:
             self.Ek[eid] += 1
         return costREM
 
-    def backtracking(self, level, E, P, c_idx, c_eid, cost, costADD):
-        while level >= 0:
+    def select_segment(self, level):
+        '''Segment of level and its available edges. The dynamic rules move the chosen
+           segment to ordS[level]: ordS[level:] are the segments not assigned in any
+           order, so backtracking does not undo the swaps.
+        '''
+        if self.select == 'static':
+            sid = self.ordS[level]
+            return sid, self.available_edges(list(self.S[sid].eid))
+        best, E = level, None
+        if self.select == 'weight':
+            for k in range(level + 1, len(self.ordS)):
+                if self.S[self.ordS[k]].weight > self.S[self.ordS[best]].weight:
+                    best = k
+        else:
+            if self.avail is None:
+                self.avail = {sid: self.available_edges(list(self.S[sid].eid)) for sid in self.S}
+                self.avail_undo = {}
+            key = None
+            for k in range(level, len(self.ordS)):
+                sid = self.ordS[k]
+                Ek = self.avail[sid]
+                if key is None or (len(Ek), -self.S[sid].weight) < key:
+                    best, E, key = k, Ek, (len(Ek), -self.S[sid].weight)
+                    if len(Ek) == 1:
+                        break
+        self.ordS[level], self.ordS[best] = self.ordS[best], self.ordS[level]
+        sid = self.ordS[level]
+        return sid, self.available_edges(list(self.S[sid].eid)) if E is None else E
+
+    def backtracking(self, level, E, P, c_idx, c_eid, cost, costADD, entry=None, costUB=None, floor=0):
+        '''entry[i]: partial cost and number of nodes when the level i was entered. The
+           states left after trying all their choices are added to the nogood cache (no
+           completion cheaper than costUB - partial cost) when their subtree is not small.
+           floor: first level that may change (the levels below are a fixed prefix).
+        '''
+        while level >= floor:
             sid = self.ordS[level]
             cost -= self.rem_cost(level, sid, costADD)
             c_eid[sid] = None
             self.G.remove_edges_from(P[level])
+            self.restore_avail(level)
             P[level] = []
             if c_idx[level] < (len(E[level]) - 1):
                 c_idx[level] += 1
                 break
             E[level] = []
             c_idx[level] = 0
+            # the state is the same as when the level was entered
+            if entry is not None and entry[level] is not None:
+                cost0, nodes0 = entry[level]
+                entry[level] = None
+                if self.nodes - nodes0 >= NOGOOD_MIN_NODES:
+                    self.nogood_put(self.signature(level, c_eid), costUB - cost0)
             level -= 1
-        return level if level >= 0 else None, cost
+        return level if level >= floor else None, cost
+
+    def start_from(self, prefix):
+        '''Assign the edges of prefix to the first segments of ordS as the search does
+           (updating self.G and self.Ek). Returns the search state c_idx, c_eid, costADD,
+           E, P and the partial cost.
+        '''
+        c_eid = {sid: None for sid in self.S}
+        c_idx = np.zeros(len(self.ordS), dtype=int)
+        costADD = c_idx.copy()
+        E = [[] for _ in range(len(c_idx))]
+        P = [[] for _ in range(len(c_idx))]
+        cost = 0
+        for level, eid in enumerate(prefix):
+            sid, E[level] = self.select_segment(level)
+            c_idx[level] = E[level].index(eid)
+            c_eid[sid] = eid
+            P[level] = self.add_precedence(eid, E[level], level)
+            costADD[level] = self.add_cost(sid, c_eid, np.inf)
+            cost += costADD[level]
+        return c_idx, c_eid, costADD, E, P, cost
+
+    def children(self, prefix):
+        '''Prefixes one level deeper than prefix (self must be a new PriorityTree).'''
+        self.start_from(prefix)
+        sid, E = self.select_segment(len(prefix))
+        return [prefix + [eid] for eid in E]
 
     def save_order(self, c_eid:dict):
         '''Convert from c_eid (dict) to self.order (list)'''
@@ -498,7 +2219,8 @@ class PriorityTree:
         # shortest paths
         P = {eid:None for eid in self.order}
         for eid in self.order:
-            P[eid] = nx.shortest_path(self.G, source=eid)
+            # an edge without precedences was removed from G
+            P[eid] = self.nx.shortest_path(self.G, source=eid) if eid in self.G else {eid: [eid]}
         def cmp(eidA, eidB):
             if eidA in P[eidB]:
                 return -1
@@ -507,51 +2229,547 @@ class PriorityTree:
             return 0
         self.order = sorted(self.order, key=cmp_to_key(cmp))
 
-    def solve(self,tmax=60):
-        # init cost_relax
-        costLB = cost_relax(self.S, self.S)
-        if costLB == self.cost:
-            return self.order, self.cost
-        # c: vector of each segment choice
-        c_eid = {sid:None for sid in self.S}
-        c_idx = np.zeros(len(self.ordS), dtype=int)
-        costADD = c_idx.copy()  
-        level, cost = 0, 0 # index of the current segment
-        # E[i]: edges available at level 'i'
-        E = [[] for _ in range(len(c_idx))]
-        # P[i]: set of pairs precedence (eidA, eidB) added at level 'i'
-        P = [[] for _ in range(len(c_idx))]
+    def solve(self, tmax=60, warm=None, callback=None, shared=None, checkpoint=None, interval=CHECKPOINT_INTERVAL, trace=None, prefix=None):
+        '''warm: order of a related instance as atom pairs (see order_warm_start),
+                 used as the initial solution when it is better than SBBU.
+           callback: called as callback(order, cost, elapsed, lower_bound) for the initial
+                     and each improving solution; the search stops when it returns True.
+           shared: SharedBound exchanging the best cost with other solvers (see solve_portfolio).
+           checkpoint: file to save/resume the search state (see iter_solve).
+           trace: TraceWriter recording the search events (closed by the caller).
+           prefix: edges of the first segments of ordS, only the subtree below them is
+                   searched (see solve_pt_parallel).
+        '''
+        for incumbent in self.iter_solve(tmax, warm, shared, checkpoint, interval, trace, prefix):
+            if callback is not None and callback(*incumbent):
+                break
+        return self.order, self.cost
+
+    def signature(self, level, c_eid):
+        '''State of the search before assigning self.ordS[level]: the cost of completing
+           it depends only on the weight product of the segments already assigned to each
+           edge not completed yet (Ek > 0) and on the precedences among these edges
+           (see closure). The signature of a nogood is signature + (closure,).
+           With a dynamic select, the assigned segments are not given by level.
+        '''
+        W = {}
+        for sid in self.ordS[:level]:
+            eid = c_eid[sid]
+            if self.Ek[eid] > 0:
+                W[eid] = W.get(eid, 1) * self.S[sid].weight
+        if self.select != 'static':
+            return level, frozenset(W.items()), frozenset(self.ordS[:level])
+        return level, frozenset(W.items())
+
+    def closure(self):
+        '''Pairs (eidA, eidB) of edges not completed with a path eidA -> eidB in G.'''
+        R, succ = [], self.G.succ
+        for eid in succ:
+            if self.Ek[eid] == 0:
+                continue
+            # descendants of eid
+            seen, stack = set(), list(succ[eid])
+            while len(stack) > 0:
+                e = stack.pop()
+                if e not in seen:
+                    seen.add(e)
+                    stack.extend(succ[e])
+            R += [(eid, e) for e in seen if self.Ek[e] > 0]
+        return frozenset(R)
+
+    def nogood_get(self, key):
+        '''Lower bound of the cost to complete the state key (None if unknown).'''
+        if key not in self.nogood_index:
+            return None
+        key = key + (self.closure(),)
+        costLB = self.nogood.get(key)
+        if costLB is not None:
+            self.nogood.move_to_end(key)
+        return costLB
+
+    def nogood_put(self, key, costLB):
+        key = key + (self.closure(),)
+        if key in self.nogood:
+            costLB = max(costLB, self.nogood[key])
+            self.nogood.move_to_end(key)
+        else:
+            self.nogood_index[key[:2]] = self.nogood_index.get(key[:2], 0) + 1
+        self.nogood[key] = costLB
+        if len(self.nogood) > self.nogood_size:
+            old, _ = self.nogood.popitem(last=False)
+            self.nogood_index[old[:2]] -= 1
+            if self.nogood_index[old[:2]] == 0:
+                del self.nogood_index[old[:2]]
+
+    def checkpoint_options(self):
+        '''Options of the search saved in the checkpoint (strings).'''
+        return [str(self.pairwise), str(self.nogood_size), self.select]
+
+    def save_checkpoint(self, fname, level, cost, c_idx, c_eid, costADD, E, P, elapsed):
+        '''Write the search state to fname (npz) atomically. The precedence graph is the
+           union of the pairs in P and Ek follows from c_eid, so they are not saved.
+           level=None marks a completed search.
+        '''
+        data = {}
+        data['ordS'] = np.array(self.ordS, dtype=np.int64)
+        # the search depends on the options as well
+        data['options'] = np.array(self.checkpoint_options())
+        data['level'] = -1 if level is None else level
+        # costs may not fit in int64
+        data['costs'] = np.array([str(cost), str(self.cost), str(self.costLB)])
+        data['order'] = np.array(self.order, dtype=np.int64)
+        data['times'] = np.array([self.time_best, elapsed])
+        data['c_idx'] = c_idx
+        data['c_eid'] = np.array([-1 if c_eid[sid] is None else c_eid[sid] for sid in self.ordS], dtype=np.int64)
+        data['costADD'] = costADD
+        # E and P in CSR format (pointer per level)
+        data['E_ptr'] = np.cumsum([0] + [len(Ei) for Ei in E])
+        data['E'] = np.array([eid for Ei in E for eid in Ei], dtype=np.int64)
+        data['P_ptr'] = np.cumsum([0] + [len(Pi) for Pi in P])
+        data['P'] = np.array([pair for Pi in P for pair in Pi], dtype=np.int64).reshape(-1, 2)
+        ftmp = fname + '.tmp'
+        with open(ftmp, 'wb') as fid:
+            np.savez_compressed(fid, **data)
+        os.replace(ftmp, fname)
+
+    def load_checkpoint(self, fname):
+        '''Restore the search state saved by save_checkpoint (also sets self.G, self.Ek,
+           self.order, self.cost, self.costLB and self.time_best).
+           Returns level, cost, c_idx, c_eid, costADD, E, P and the elapsed time.
+        '''
+        with np.load(fname) as npz:
+            data = {key: npz[key] for key in npz.files}
+        options = data['options'].tolist() if 'options' in data else None
+        if options != self.checkpoint_options():
+            raise ValueError('The checkpoint %s was written with other options (pairwise, nogood_size, select): %s'
+                             % (fname, options))
+        ordS = data['ordS'].tolist()
+        # a dynamic select permutes ordS
+        if sorted(ordS) != sorted(self.ordS) or (self.select == 'static' and ordS != self.ordS):
+            raise ValueError('The checkpoint %s does not match the instance %s' % (fname, self.nmr.fnmr))
+        self.ordS = ordS
+        level = int(data['level'])
+        cost, self.cost, self.costLB = [int(x) for x in data['costs']]
+        self.order = data['order'].tolist()
+        self.time_best, elapsed = data['times'].tolist()
+        c_idx, costADD = data['c_idx'], data['costADD']
+        c_eid = {sid: None for sid in self.S}
+        self.Ek = {eid: len(self.E[eid].sid) for eid in self.E}
+        self.freeW = cost_relax(self.S, self.S)
+        for sid, eid in zip(self.ordS, data['c_eid'].tolist()):
+            if eid < 0:
+                continue
+            c_eid[sid] = eid
+            self.freeW -= self.S[sid].weight
+            for e in self.S[sid].eid:
+                self.Ek[e] -= 1
+        E_ptr, P_ptr = data['E_ptr'], data['P_ptr']
+        E = [data['E'][E_ptr[k]:E_ptr[k+1]].tolist() for k in range(len(self.ordS))]
+        P = [[tuple(pair) for pair in data['P'][P_ptr[k]:P_ptr[k+1]].tolist()] for k in range(len(self.ordS))]
+        self.G = self.nx.DiGraph()
+        self.avail, self.avail_undo = None, {}
+        self.add_forced()
+        for Pi in P:
+            self.G.add_edges_from(Pi)
+        return (None if level < 0 else level), cost, c_idx, c_eid, costADD, E, P, elapsed
+
+    def iter_solve(self, tmax=60, warm=None, shared=None, checkpoint=None, interval=CHECKPOINT_INTERVAL, trace=None, prefix=None):
+        '''Anytime version of solve: yields (order, cost, elapsed, lower_bound) for the
+           initial and each improving solution as soon as it is found. Closing the
+           generator (e.g. leaving the consuming loop) stops the search.
+           self.costLB is set to the optimal cost when the search is completed.
+           checkpoint: file where the search state is saved every interval seconds, on
+                       timeout and on completion. When it exists, the search resumes from
+                       it (tmax counts the time of this call only).
+           prefix: search only the orders that assign prefix to the first segments; on
+                   timeout self.unexplored has the prefixes of the subtrees left.
+        '''
         tic = time.time()
+        # time when the current best solution was found
+        self.time_best = 0
+        # costEXT: best cost found by the other solvers sharing the bound
+        costEXT = np.inf if shared is None else shared.get()
+        self.stopped = False
+        self.nodes = 0
+        self.unexplored = []
+        # levels below floor are fixed by prefix
+        floor = 0 if prefix is None else len(prefix)
+        # time spent by the previous calls resumed from the checkpoint
+        elapsed = 0
+        if checkpoint is not None and os.path.exists(checkpoint):
+            level, cost, c_idx, c_eid, costADD, E, P, elapsed = self.load_checkpoint(checkpoint)
+            if shared is not None:
+                shared.put(self.cost)
+            yield [int(eid) for eid in self.order], self.cost, elapsed, self.costLB
+            if level is None:
+                return
+        else:
+            if warm is not None:
+                orderWS, self.costWS = order_warm_start(self.nmr, warm)
+                if self.costWS < self.cost:
+                    self.order, self.cost = orderWS, self.costWS
+            # init cost_relax
+            costLB = cost_relax(self.S, self.S)
+            self.costLB = costLB
+            if shared is not None:
+                shared.put(self.cost)
+            yield [int(eid) for eid in self.order], self.cost, time.time() - tic, self.costLB
+            if costLB == self.cost:
+                if shared is not None:
+                    shared.stop()
+                return
+            # c: vector of each segment choice
+            c_eid = {sid:None for sid in self.S}
+            c_idx = np.zeros(len(self.ordS), dtype=int)
+            costADD = c_idx.copy()  
+            level, cost = 0, 0 # index of the current segment
+            # E[i]: edges available at level 'i'
+            E = [[] for _ in range(len(c_idx))]
+            # P[i]: set of pairs precedence (eidA, eidB) added at level 'i'
+            P = [[] for _ in range(len(c_idx))]
+            if prefix is not None:
+                c_idx, c_eid, costADD, E, P, cost = self.start_from(prefix)
+                level = floor
+        # signature and partial cost of each level when it was entered (nogood cache)
+        # entry[i]: partial cost and number of nodes when the level i was entered
+        entry = [None for _ in self.ordS]
+        if trace is not None:
+            trace.add(-1, -1, self.cost, self.costLB, TRACE_INCUMBENT)
+        tic_checkpoint = time.time()
         while level is not None:
             toc = time.time() - tic
             if toc > tmax:
                 self.timeout = True
                 print('> timeoutBB %f seconds' % toc)
-                return self.order, self.cost
-            sid = self.ordS[level]
+                if checkpoint is not None:
+                    self.save_checkpoint(checkpoint, level, cost, c_idx, c_eid, costADD, E, P, elapsed + toc)
+                if prefix is not None:
+                    # the children of prefix not completed yet (the current one is restarted)
+                    self.unexplored = [prefix + [eid] for eid in E[floor][c_idx[floor]:]] if len(E[floor]) > 0 else [prefix]
+                return
+            if checkpoint is not None and time.time() - tic_checkpoint > interval:
+                self.save_checkpoint(checkpoint, level, cost, c_idx, c_eid, costADD, E, P, elapsed + toc)
+                tic_checkpoint = time.time()
+            self.nodes += 1
+            if shared is not None and self.nodes % SHARED_POLL == 0:
+                if shared.stopped():
+                    self.stopped = True
+                    return
+                costEXT = shared.get()
+            costUB = min(self.cost, costEXT)
+            if len(E[level]) == 0 and level > 0 and self.nogood_size > 0:
+                entry[level] = (cost, self.nodes)
+                costNG = self.nogood_get(self.signature(level, c_eid))
+                # the completions of this state were already shown to cost at least costNG
+                if costNG is not None and cost + costNG >= costUB:
+                    self.nogood_hits += 1
+                    if trace is not None:
+                        trace.add(level, -1, cost, cost + costNG, TRACE_SKIP)
+                    entry[level] = None
+                    level, cost = self.backtracking(level - 1, E, P, c_idx, c_eid, cost, costADD, entry, costUB, floor)
+                    continue
             if len(E[level]) == 0:
-                E[level] = self.available_edges(list(self.S[sid].eid))
+                E[level] = self.select_segment(level)[1]
+            sid = self.ordS[level]
             eid = E[level][c_idx[level]]
             c_eid[sid] = eid
-            P[level] = self.add_precedence(eid, E[level])
-            costADD[level] = self.add_cost(sid, c_eid, self.cost)
+            P[level] = self.add_precedence(eid, E[level], level)
+            costADD[level] = self.add_cost(sid, c_eid, costUB)
             cost += costADD[level]
             # solution found
-            if (cost < self.cost) and (level == (len(self.ordS) - 1)):
+            found = (cost < self.cost) and (level == (len(self.ordS) - 1))
+            if found:
                 self.cost = cost
-                self.save_order(c_eid) 
+                self.save_order(c_eid)
+                self.time_best = elapsed + toc
+                if shared is not None:
+                    shared.put(self.cost)
+                if trace is not None:
+                    trace.add(level, eid, cost, cost, TRACE_INCUMBENT)
+                yield [int(eid) for eid in self.order], self.cost, elapsed + toc, self.costLB
             # next
-            if (cost < self.cost) and (level < (len(self.ordS) - 1)):
+            costLB = cost
+            if self.pairwise:
+                # the classes of tailW are fixed by the static ordS
+                costLB += self.tailW[level + 1] if self.select == 'static' else self.freeW
+            if (costLB < min(self.cost, costEXT)) and (level < (len(self.ordS) - 1)):
+                if trace is not None:
+                    trace.add(level, eid, cost, costLB, TRACE_BRANCH)
                 level += 1
             else:
-                level, cost = self.backtracking(level, E, P, c_idx, c_eid, cost, costADD)
-        return self.order, self.cost
+                if trace is not None and not found:
+                    trace.add(level, eid, cost, costLB, TRACE_PRUNE)
+                level, cost = self.backtracking(level, E, P, c_idx, c_eid, cost, costADD, entry, min(self.cost, costEXT), floor)
+        # no order (starting with prefix) is cheaper than the best one (own or shared)
+        self.costLB = min(self.cost, costEXT)
+        if shared is not None and prefix is None:
+            shared.stop()
+        if checkpoint is not None:
+            self.save_checkpoint(checkpoint, None, cost, c_idx, c_eid, costADD, E, P, elapsed + time.time() - tic)
+
+
+# seconds of search of a subtree before it is split (see solve_pt_parallel)
+PT_SLICE = 1
+# subtrees per process created before the search starts
+PT_SPLIT = 4
+
+# instance shared by the PriorityTree workers (set by _pt_init)
+_PT = {}
+
+
+def _pt_init(nmr, shared):
+    _PT['nmr'], _PT['shared'] = nmr, shared
+
+
+def _pt_task(args):
+    prefix, tmax = args
+    pt = PriorityTree(_PT['nmr'])
+    pt.solve(tmax=tmax, shared=_PT['shared'], prefix=prefix)
+    return [int(eid) for eid in pt.order], pt.cost, pt.unexplored, pt.nodes
+
+
+def solve_pt_parallel(nmr: NMR, tmax=60, nproc=None, depth=None, slice=PT_SLICE):
+    '''PriorityTree with the subtrees below the edges chosen for the first segments of
+       ordS searched by a pool of processes sharing the best cost (SharedBound).
+       depth: number of fixed segments of the initial subtrees (default: the smallest
+              giving PT_SPLIT subtrees per process).
+       slice: a subtree searched for longer is handed back split in its children not
+              completed yet, which go to the end of the queue, so the idle processes
+              take over the unbalanced subtrees.
+       Returns the order, its cost and True when it is proven optimal.
+    '''
+    import multiprocessing as mp
+    tic = time.time()
+    nproc = mp.cpu_count() if nproc is None else nproc
+    orderOPT, costOPT = order_sbbu(nmr)
+    if costOPT == cost_relax(nmr.S, nmr.S):
+        return orderOPT, costOPT, True
+    nlevels = len(PriorityTree(nmr).ordS)
+    prefixes = [[]]
+    while len(prefixes) > 0 and len(prefixes[0]) < nlevels - 1:
+        if depth is None and len(prefixes) >= PT_SPLIT * nproc:
+            break
+        if depth is not None and len(prefixes[0]) == depth:
+            break
+        prefixes = [child for prefix in prefixes for child in PriorityTree(nmr).children(prefix)]
+    shared = SharedBound()
+    shared.put(costOPT)
+    proven = True
+    with mp.Pool(nproc, initializer=_pt_init, initargs=(nmr, shared)) as pool:
+        tasks = [pool.apply_async(_pt_task, ((prefix, slice),)) for prefix in prefixes]
+        while len(tasks) > 0:
+            if time.time() - tic > tmax or shared.stopped():
+                proven = shared.stopped()
+                pool.terminate()
+                break
+            done = [task for task in tasks if task.ready()]
+            if len(done) == 0:
+                time.sleep(0.01)
+                continue
+            for task in done:
+                tasks.remove(task)
+                order, cost, unexplored, nodes = task.get()
+                if cost < costOPT:
+                    orderOPT, costOPT = order, cost
+                # each subtree left runs at most until tmax
+                tslice = min(slice, max(0, tmax - (time.time() - tic)))
+                tasks += [pool.apply_async(_pt_task, ((prefix, tslice),)) for prefix in unexplored]
+    return orderOPT, costOPT, proven
+
+
+PORTFOLIO_SOLVERS = ('GD', 'SB', 'PT', 'BB')
+
+
+def _portfolio_member(name, nmr, tmax, shared, queue, t0):
+    '''Runs one solver of the portfolio and sends (name, order, cost, time, done, proven)
+       to the queue for each incumbent; the last message has done=True.
+    '''
+    def report(order, cost, elapsed=None, costLB=None):
+        queue.put((name, order, cost, time.time() - t0, False, False))
+        return shared.stopped()
+
+    order, cost, proven = None, np.inf, False
+    if name in ('GD', 'SB', 'DP'):
+        solver = {'GD': order_greedy, 'SB': order_sbbu, 'DP': order_dp}[name]
+        order, cost = solver(nmr)
+        order = [int(eid) for eid in order]
+        shared.put(cost)
+        report(order, cost)
+        proven = name == 'DP' or cost == cost_relax(nmr.S, nmr.S)
+        if proven:
+            shared.stop()
+    elif name in ('PT', 'BB'):
+        solver = PriorityTree(nmr) if name == 'PT' else BB(nmr)
+        solver.solve(tmax=tmax, callback=report, shared=shared)
+        cost = solver.cost if name == 'PT' else solver.costUB
+        proven = not (solver.timeout or solver.stopped)
+    else:
+        raise ValueError('Unknown solver %s' % name)
+    queue.put((name, None, cost, time.time() - t0, True, proven))
+
+
+def solve_portfolio(nmr: NMR, tmax=60, solvers=PORTFOLIO_SOLVERS):
+    '''Runs the solvers in parallel processes sharing the best cost (SharedBound).
+       The exact solvers prune with the shared cost, and all of them stop as soon as
+       one proves optimality (completed search or cost equal to cost_relax).
+       Returns (order, cost, winner, time) where winner is the solver that found
+       the best order first and time is when it was found.
+    '''
+    import multiprocessing as mp
+    t0 = time.time()
+    shared = SharedBound()
+    queue = mp.Queue()
+    procs = [mp.Process(target=_portfolio_member, args=(name, nmr, tmax, shared, queue, t0), daemon=True) for name in solvers]
+    for proc in procs:
+        proc.start()
+    orderBEST, costBEST, winner, timeBEST = None, np.inf, None, 0
+    running = len(procs)
+    while running > 0:
+        try:
+            name, order, cost, elapsed, done, proven = queue.get(timeout=0.1)
+        except Empty:
+            # a member died without reporting, or the time is over
+            if time.time() - t0 > tmax + 1 or not any(proc.is_alive() for proc in procs):
+                break
+            continue
+        if done:
+            running -= 1
+        elif cost < costBEST:
+            orderBEST, costBEST, winner, timeBEST = order, cost, name, elapsed
+    shared.stop()
+    for proc in procs:
+        proc.join(timeout=1)
+        if proc.is_alive():
+            proc.terminate()
+    return orderBEST, costBEST, winner, timeBEST
+
+
+# persistent cache of the optimal orders of the blocks (see solve_blocks)
+BLOCK_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'bb-sbbu', 'blocks.sqlite')
+
+
+def block_key(nmr: NMR):
+    '''Canonical form of an instance with one component: each edge covers consecutive
+       segments, so the block is given by the segment lengths (log2 of the weights)
+       and the (first, last) segment of each edge, up to the reversal of the chain.
+       Returns the sha256 of the canonical form and the eids in canonical order.
+    '''
+    import hashlib
+    segments = sorted(nmr.S.values(), key=lambda s: s.i)
+    lengths = [s.j - s.i + 1 for s in segments]
+    pos = {s.sid: k for k, s in enumerate(segments)}
+    m = len(segments) - 1
+    forms = []
+    for reverse in [False, True]:
+        edges = []
+        for eid, edge in nmr.E.items():
+            a, b = min(pos[sid] for sid in edge.sid), max(pos[sid] for sid in edge.sid)
+            edges.append((m - b, m - a, eid) if reverse else (a, b, eid))
+        edges.sort()
+        form = '%s|%s' % (lengths[::-1] if reverse else lengths, [(a, b) for a, b, eid in edges])
+        forms.append((form, [eid for a, b, eid in edges]))
+    form, eids = min(forms)
+    return hashlib.sha256(form.encode()).hexdigest(), eids
+
+
+class BlockCache:
+    '''Optimal orders of blocks (sqlite file shared by the runs and the processes),
+       keyed by block_key and stored as positions in the canonical order of the edges.
+    '''
+
+    def __init__(self, fname=BLOCK_CACHE) -> None:
+        if os.path.dirname(fname):
+            os.makedirs(os.path.dirname(fname), exist_ok=True)
+        import sqlite3
+        self.db = sqlite3.connect(fname, timeout=30)
+        self.db.execute('CREATE TABLE IF NOT EXISTS blocks (key TEXT PRIMARY KEY, cost TEXT, ord TEXT)')
+        self.db.commit()
+        self.hits, self.misses = 0, 0
+
+    def get(self, key):
+        '''(positions, cost) of the block or None.'''
+        row = self.db.execute('SELECT cost, ord FROM blocks WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [int(k) for k in row[1].split()], int(row[0])
+
+    def put(self, key, positions, cost):
+        # costs may not fit in int64
+        self.db.execute('INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)', (key, str(cost), ' '.join(map(str, positions))))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def solve_blocks(nmr: NMR, solver='PT', tmax=60, cache=None):
+    '''Solves each component (block) of nmr on its own with PriorityTree (PT) or BB: the
+       cost of an order is the sum of the costs of the blocks, so the concatenation of
+       optimal block orders is optimal. The BlockCache cache is looked up before solving
+       a block and keeps the orders proven optimal.
+       Returns the order, its cost and True when it is proven optimal.
+    '''
+    tic = time.time()
+    order, cost, optimal = [], 0, True
+    for eids in nmr.components():
+        sub = nmr.subinstance(eids)
+        if len(eids) == 1:
+            order += eids
+            cost += order_cost(eids, sub.E, sub.S)
+            continue
+        key, canon = block_key(sub) if cache is not None else (None, None)
+        hit = cache.get(key) if cache is not None else None
+        if hit is not None:
+            orderB = [canon[k] for k in hit[0]]
+            # guard against hash collisions
+            if order_cost(orderB, sub.E, sub.S) == hit[1]:
+                order += orderB
+                cost += hit[1]
+                continue
+        tmaxB = max(0, tmax - (time.time() - tic))
+        if solver == 'PT':
+            search = PriorityTree(sub)
+            orderB, costB = search.solve(tmax=tmaxB)
+        elif solver == 'BB':
+            search = BB(sub)
+            orderB, costB = search.solve(tmax=tmaxB)
+        else:
+            raise ValueError('Unknown solver %s (options: PT, BB)' % solver)
+        orderB = [int(eid) for eid in orderB]
+        # PriorityTree leaves out the edges covering no segment first (zero cost at the end)
+        orderB += sorted(set(eids).difference(orderB))
+        if search.timeout:
+            optimal = False
+        elif cache is not None:
+            rank = {eid: k for k, eid in enumerate(canon)}
+            cache.put(key, [rank[eid] for eid in orderB], costB)
+        order += orderB
+        cost += costB
+    return order, cost, optimal
 
 
 def call_solvers(*argv):
     fnmr = '/home/michael/gitrepos/bb-sbbu/DATA_TEST/testC.nmr'
     tmax = 1
     clean_log = False
+    stream = False
+    mmap = False
+    cache = False
+    dp = False
+    fwarm = None
+    save_order = False
+    portfolio = False
+    best_first = False
+    checkpoint = False
+    mem = False
+    blocks = False
+    fblocks = BLOCK_CACHE
+    nproc = None
+    lds = None
+    pairwise = False
+    select = 'static'
     for i, arg in enumerate(argv):
         if arg == '-fnmr':
             fnmr = argv[i+1]
@@ -559,6 +2777,44 @@ def call_solvers(*argv):
             tmax = float(argv[i+1])
         if arg == '-clean_log':
             clean_log = True
+        if arg == '-stream':
+            stream = True
+        if arg == '-mmap':
+            mmap = True
+        if arg == '-cache':
+            cache = True
+        if arg == '-dp':
+            dp = True
+        if arg == '-warm':
+            # related instance solved before with -save_order
+            fwarm = argv[i+1].replace('.nmr', '_PT.ord')
+        if arg == '-save_order':
+            save_order = True
+        if arg == '-portfolio':
+            portfolio = True
+        if arg == '-best_first':
+            best_first = True
+        if arg == '-checkpoint':
+            checkpoint = True
+        if arg == '-mem':
+            # peak memory of each phase (slower)
+            mem = True
+        if arg == '-blocks':
+            blocks = True
+        if arg == '-block_cache':
+            fblocks = argv[i+1]
+        if arg == '-nproc':
+            # parallel PriorityTree
+            nproc = int(argv[i+1])
+        if arg == '-lds':
+            # heuristic order of the limited-discrepancy search (sbbu or greedy)
+            lds = argv[i+1]
+        if arg == '-pairwise':
+            # forced precedences and pairwise bound in PriorityTree
+            pairwise = True
+        if arg == '-select':
+            # segment selection of PriorityTree (static, fewest or weight)
+            select = argv[i+1]
 
     flog = fnmr.replace('.nmr', '.log')
     # check if already has a log file
@@ -570,8 +2826,12 @@ def call_solvers(*argv):
     write_log(fid, '> fnmr ' + fnmr)
 
     # read instance
-    nmr = NMR(fnmr)
+    probe = MemoryProbe(mem)
+    probe.start()
+    nmr = NMR(fnmr, stream=stream, mmap=mmap, cache=cache, probe=probe)
     E, S = nmr.E, nmr.S
+    # segments and ordering data ('Parse' when loaded from the cache)
+    probe.stop('Segments' if 'Parse' in probe.phases else 'Parse')
 
     write_log(fid, '> tmax (secs) ....... %g' % tmax)
     write_log(fid, '> nnodes ............ %d' % nmr.nnodes)
@@ -582,36 +2842,132 @@ def call_solvers(*argv):
     write_log(fid, '> costRX ............ %d' % costRELAX)
 
     # call order_greedy
+    probe.start()
     tic = time.time()
     orderGREEDY, costGREEDY = order_greedy(nmr)
     toc = time.time() - tic
+    probe.stop('GD')
     write_log(fid, '> costGD ............ %d' % costGREEDY)
     write_log(fid, '> timeGD (secs) ..... %g' % toc)
 
     # call order_sbbu
+    probe.start()
     tic = time.time()
     orderSBBU, costSBBU = order_sbbu(nmr)
     toc = time.time() - tic
+    probe.stop('SB')
     write_log(fid, '> costSB ............ %d' % costSBBU)
     write_log(fid, '> timeSB (secs) ..... %g' % toc)
 
+    # call order_dp (exact, only for small instances)
+    if dp and len(E) <= DP_MAX_EDGES:
+        probe.start()
+        tic = time.time()
+        orderDP, costDP = order_dp(nmr)
+        toc = time.time() - tic
+        probe.stop('DP')
+        write_log(fid, '> costDP ............ %d' % costDP)
+        write_log(fid, '> timeDP (secs) ..... %g' % toc)
+
+    # warm start from a related instance
+    warm = None
+    if fwarm is not None:
+        warm = read_order_pairs(fwarm)
+        write_log(fid, '> fwarm ' + fwarm)
+
     # call priority_tree
+    probe.start()
     tic = time.time()
-    pt = PriorityTree(nmr)
-    orderPT, costPT = pt.solve()
+    pt = PriorityTree(nmr, pairwise=pairwise, select=select)
+    # resume from the last checkpoint (if any)
+    fckpt = fnmr.replace('.nmr', '_PT.ckpt') if checkpoint else None
+    orderPT, costPT = pt.solve(tmax=tmax, warm=warm, checkpoint=fckpt)
     toc = time.time() - tic
+    probe.stop('PT')
+    if warm is not None:
+        write_log(fid, '> costWS ............ %d' % pt.costWS)
     write_log(fid, '> costPT ............ %d' % costPT)
     write_log(fid, '> timePT (secs) ..... %g' % toc)
+    # time to the best solution (compare with and without -warm)
+    write_log(fid, '> ttbPT (secs) ...... %g' % pt.time_best)
+    write_log(fid, '> nodesPT ........... %d' % pt.nodes)
+    if pairwise:
+        write_log(fid, '> forcedPT .......... %d' % sum(len(pred) for pred in pt.pred.values()))
+    if save_order:
+        write_order_pairs(fnmr.replace('.nmr', '_PT.ord'), orderPT, E)
+
+    # call priority_tree on nproc processes
+    if nproc is not None:
+        tic = time.time()
+        orderPP, costPP, optimalPP = solve_pt_parallel(nmr, tmax, nproc)
+        toc = time.time() - tic
+        write_log(fid, '> costPP ............ %d' % costPP)
+        write_log(fid, '> optimalPP ......... %s' % optimalPP)
+        write_log(fid, '> timePP (secs) ..... %g' % toc)
+
+    # solve the blocks on their own, reusing the ones solved before
+    if blocks:
+        tic = time.time()
+        cache = BlockCache(fblocks)
+        orderBK, costBK, optimalBK = solve_blocks(nmr, 'PT', tmax, cache)
+        toc = time.time() - tic
+        write_log(fid, '> costBK ............ %d' % costBK)
+        write_log(fid, '> optimalBK ......... %s' % optimalBK)
+        write_log(fid, '> hitsBK ............ %d' % cache.hits)
+        write_log(fid, '> missesBK .......... %d' % cache.misses)
+        write_log(fid, '> timeBK (secs) ..... %g' % toc)
+        cache.close()
+
+    # call the solvers concurrently sharing the best cost
+    if portfolio:
+        probe.start()
+        tic = time.time()
+        orderPF, costPF, winnerPF, timePF = solve_portfolio(nmr, tmax=tmax)
+        toc = time.time() - tic
+        # the solvers run in child processes (only their max RSS is known)
+        probe.stop('PF', who='children')
+        write_log(fid, '> costPF ............ %d' % costPF)
+        write_log(fid, '> winnerPF .......... %s' % winnerPF)
+        # time when the winner found the best order
+        write_log(fid, '> ttbPF (secs) ...... %g' % timePF)
+        write_log(fid, '> timePF (secs) ..... %g' % toc)
+
+    # call the best-first search (reports the proven gap on timeout)
+    if best_first:
+        probe.start()
+        tic = time.time()
+        bb = BB(nmr)
+        orderBF, costBF = bb.solve_best_first(tmax=tmax)
+        toc = time.time() - tic
+        probe.stop('BF')
+        write_log(fid, '> costBF ............ %d' % costBF)
+        write_log(fid, '> lbBF .............. %d' % bb.costLB)
+        write_log(fid, '> gapBF ............. %g' % bb.gap)
+        write_log(fid, '> timeBF (secs) ..... %g' % toc)
+
+    # call the limited-discrepancy search (anytime, for the instances BB cannot finish)
+    if lds is not None:
+        tic = time.time()
+        bb = BB(nmr)
+        orderLD, costLD = bb.solve_lds(tmax=tmax, heuristic=lds)
+        toc = time.time() - tic
+        write_log(fid, '> costLD ............ %d' % costLD)
+        # last iteration completed (number of discrepancies)
+        write_log(fid, '> kLD ............... %d' % bb.lds_k)
+        write_log(fid, '> ttbLD (secs) ...... %g' % bb.time_best)
+        write_log(fid, '> timeLD (secs) ..... %g' % toc)
 
     # call order_bb
     # tic = time.time()
     # bb = BB(nmr)
-    # costBB, costBB = bb.solve(tmax=tmax)
+    # costBB, costBB = bb.solve(tmax=tmax, dump=True)
     # toc = time.time() - tic
     # write_log(fid, '> timeoutBB ......... %s' % bb.timeout)
     # write_log(fid, '> costBB ............ %d' % costBB)
     # write_log(fid, '> timeBB (secs) ..... %g' % toc)
 
+    probe.write(fid)
+    probe.close()
     fid.close()
 
 
@@ -2,10 +2,24 @@
 # 1. https://docs.python.org/3/library/unittest.html
 
 import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import time
+import itertools
+import tracemalloc
 import pandas as pd
+import networkx as nx
+import multiprocessing as mp
 import unittest
 # from tkinter import SE
 from bb import *
+# scripts of the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run_queue
+import replay_trace
+import solve
 
 
 class TestNMR(unittest.TestCase):
@@ -24,6 +38,166 @@ class TestNMR(unittest.TestCase):
             self.assertTrue(S[i] == Sans[i])
 
 
+def write_random_nmr(fnmr, nnodes, nedges, seed):
+    '''Write an instance with nedges random prune edges (as in create_random.py).'''
+    rng = np.random.default_rng(seed)
+    E = set()
+    while len(E) < nedges:
+        i = int(rng.integers(1, nnodes - 3))
+        j = int(rng.integers(i + 4, nnodes + 1))
+        E.add((i, j))
+    with open(fnmr, "w") as fid:
+        for i, j in sorted(E):
+            fid.write("%3d %3d 1 1 X X PRO PRO\n" % (i, j))
+    return fnmr
+
+
+class NMRFileCase(unittest.TestCase):
+    '''Works on a copy of an instance, so the files created beside it are discarded.'''
+    def setUp(self):
+        self.wdir = tempfile.mkdtemp()
+        self.fnmr = os.path.join(self.wdir, "1bdo_chain_A_dmax_5.nmr")
+        shutil.copy(os.path.join("data", "nmr", "1bdo_chain_A_dmax_5.nmr"), self.fnmr)
+
+    def tearDown(self):
+        shutil.rmtree(self.wdir)
+
+    def check_same(self, nmrA, nmrB):
+        self.assertEqual(nmrA.nnodes, nmrB.nnodes)
+        self.assertEqual(sorted(nmrA.E), sorted(nmrB.E))
+        for eid in nmrA.E:
+            self.assertEqual((nmrA.E[eid].i, nmrA.E[eid].j), (nmrB.E[eid].i, nmrB.E[eid].j))
+            self.assertEqual(nmrA.E[eid].sid, nmrB.E[eid].sid)
+        self.assertEqual(len(nmrA.segments), len(nmrB.segments))
+        for sA, sB in zip(nmrA.segments, nmrB.segments):
+            self.assertTrue(sA == sB)
+            self.assertEqual(sA.eid, sB.eid)
+
+
+class RandomNMRCase(unittest.TestCase):
+    '''Works on random instances (see write_random_nmr) in a temporary folder.'''
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def random_fnmr(self, nnodes, nedges, seed, fn="rand.nmr"):
+        return write_random_nmr(os.path.join(self.tmp, fn), nnodes, nedges, seed)
+
+    def random_instance(self, nnodes, nedges, seed):
+        '''Random instance and its optimal cost (order_dp).'''
+        nmr = NMR(self.random_fnmr(nnodes, nedges, seed))
+        return nmr, order_dp(nmr)[1]
+
+
+class TestNMRStream(NMRFileCase):
+    def test_stream(self):
+        nmr = NMR(self.fnmr)
+        # small chunks force several blocks
+        nmrST = NMR(self.fnmr, stream=True, chunk_size=100)
+        self.assertEqual(len(nmrST.edges), 0)
+        self.check_same(nmr, nmrST)
+
+    def test_mmap(self):
+        nmr = NMR(self.fnmr)
+        nmrMM = NMR(self.fnmr, mmap=True)
+        self.assertTrue(os.path.exists(self.fnmr.replace(".nmr", ".bin")))
+        self.assertTrue(isinstance(nmrMM.pruneArray, np.memmap))
+        self.check_same(nmr, nmrMM)
+        # reuse the binary file already created
+        self.check_same(nmr, NMR(self.fnmr, mmap=True))
+
+
+class TestNMRCache(NMRFileCase):
+    def test_cache(self):
+        nmr = NMR(self.fnmr)
+        fcache = self.fnmr.replace(".nmr", ".npz")
+        self.check_same(nmr, NMR(self.fnmr, cache=True))
+        self.assertTrue(os.path.exists(fcache))
+        nmrCH = NMR(self.fnmr, cache=True)
+        self.assertEqual(len(nmrCH.edges), 0)
+        self.check_same(nmr, nmrCH)
+        for sid in nmr.S:
+            self.assertEqual(nmr.S[sid].weight, nmrCH.S[sid].weight)
+        self.assertEqual(order_sbbu(nmr)[1], order_sbbu(nmrCH)[1])
+
+    def test_invalidate(self):
+        NMR(self.fnmr, cache=True)
+        # drop the last prune edge from the source
+        with open(self.fnmr, "r") as fid:
+            rows = fid.readlines()
+        k = max(k for k, row in enumerate(rows) if int(row.split()[1]) > int(row.split()[0]) + 3)
+        with open(self.fnmr, "w") as fid:
+            fid.writelines(rows[:k] + rows[k+1:])
+        nmr = NMR(self.fnmr)
+        self.check_same(nmr, NMR(self.fnmr, cache=True))
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def test_overlapping(self):
+        lo, hi = [1, 3, 3, 8, 10, 15], [5, 4, 9, 8, 20, 16]
+        index = IntervalIndex(lo, hi, ["a", "b", "c", "d", "e", "f"])
+        self.assertEqual(index.stabbing(4), ["a", "b", "c"])
+        self.assertEqual(index.stabbing(8), ["c", "d"])
+        self.assertEqual(index.stabbing(21), [])
+        self.assertEqual(index.overlapping(6, 12), ["c", "d", "e"])
+        self.assertEqual(index.overlapping(0, 100), ["a", "b", "c", "d", "e", "f"])
+
+    def test_nmr_queries(self):
+        nmr = NMR(os.path.join("data", "nmr", "1bdo_chain_A_dmax_5.nmr"))
+        E = nmr.pruneEdges
+        for k in range(nmr.nnodes + 2):
+            eids = sorted(e.eid for e in E if e.i + 3 <= k <= e.j)
+            self.assertEqual(nmr.edges_covering(k), eids)
+            eids = sorted(e.eid for e in E if e.i + 3 <= k + 4 and k <= e.j)
+            self.assertEqual(nmr.edges_overlapping(k, k + 4), eids)
+        for eid in nmr.E:
+            sids = sorted(s.sid for s in nmr.segments if nmr.E[eid].check_cover(s))
+            self.assertEqual(nmr.segments_inside(eid), sids)
+            self.assertEqual(sorted(nmr.E[eid].sid), sids)
+
+
+class TestNMRUpdate(unittest.TestCase):
+    def canonical(self, nmr):
+        # segments and incidence labelled by atoms instead of ids
+        E, S = nmr.E, nmr.S
+        segments = [(s.i, s.j, s.weight, sorted((E[e].i, E[e].j) for e in s.eid)) for s in nmr.segments]
+        edges = sorted((e.i, e.j, sorted((S[s].i, S[s].j) for s in e.sid)) for e in E.values())
+        self.assertEqual(sorted(S), sorted(s.sid for s in nmr.segments))
+        return segments, edges
+
+    def test_add_remove(self):
+        nmr = NMR(os.path.join("data", "nmr_test", "testC_chain_A_dmax_5.nmr"))
+        ref = self.canonical(nmr)
+        sids = set(nmr.S)
+        eid, changes = nmr.add_edge(2, 12)
+        self.assertNotIn(eid, [e.eid for e in nmr.pruneEdges[:-1]])
+        self.assertEqual(set(nmr.S), (sids - set(changes["removed"])) | set(changes["added"]))
+        nmr.remove_edge(eid)
+        self.assertEqual(self.canonical(nmr), ref)
+
+    def test_dmax_sweep(self):
+        F = [os.path.join("data", "nmr", "1bdo_chain_A_dmax_%d.nmr" % dmax) for dmax in [4, 5, 6, 7]]
+        nmr = NMR(F[0])
+        for fnmr in F[1:] + F[::-1]:
+            old = {s.sid: (s.i, s.j) for s in nmr.segments}
+            eids = {eid: (e.i, e.j) for eid, e in nmr.E.items()}
+            changes = nmr.update_from(fnmr)
+            ref = NMR(fnmr)
+            self.assertEqual(self.canonical(nmr), self.canonical(ref))
+            self.assertEqual(order_sbbu(nmr)[1], order_sbbu(ref)[1])
+            # untouched edges and segments keep their ids
+            for eid in eids:
+                if eid in nmr.E:
+                    self.assertEqual(eids[eid], (nmr.E[eid].i, nmr.E[eid].j))
+            for sid in old:
+                if sid in nmr.S:
+                    self.assertEqual(old[sid], (nmr.S[sid].i, nmr.S[sid].j))
+            self.assertEqual(set(old) - set(nmr.S), set(changes["removed"]))
+            self.assertEqual(set(nmr.S) - set(old), set(changes["added"]))
+            eids = sorted(e for e in nmr.E if nmr.E[e].i + 3 <= 50 <= nmr.E[e].j)
+            self.assertEqual(nmr.edges_covering(50), eids)
+
+
 class TestBB(unittest.TestCase):
     def test_solveA(self):
         nmr = NMR("data/nmr_test/testA.nmr")
@@ -81,6 +255,13 @@ class TestBBPerm(unittest.TestCase):
         emin = p.minGT(15)
         self.assertEqual(emin, 18)
 
+    def test_rank(self):
+        E = {9, 15, 5, 20, 18, 7}
+        rank = {eid: -eid for eid in E}
+        self.assertEqual(BBPerm(E, rank).minGT(15), 9)
+        p = BBPerm(E, rank)
+        self.assertEqual([p.next() for _ in E], sorted(E, reverse=True))
+
     def test_start_from(self):
         nmr = NMR("data/nmr_test/testC.nmr")
         E = nmr.E
@@ -133,6 +314,787 @@ class TestPriorityTree(unittest.TestCase):
             self.assertEqual(costOPT, cost)
 
 
+class TestBruteDFS(RandomNMRCase):
+    def test_nmr_test(self):
+        wdir = os.path.join("data", "nmr_test")
+        for fn in sorted(os.listdir(wdir)):
+            if not fn.endswith(".nmr"):
+                continue
+            nmr = NMR(os.path.join(wdir, fn))
+            orderBF, costBF = order_brute(nmr)
+            orderDF, costDF = order_brute_dfs(nmr)
+            self.assertEqual(costBF, costDF)
+            self.assertEqual(order_cost(orderDF, nmr.E, nmr.S), costDF)
+
+    def test_random(self):
+        for seed in range(5):
+            fnmr = self.random_fnmr(30, 7, seed, "rand%d.nmr" % seed)
+            nmr = NMR(fnmr)
+            orderBF, costBF = order_brute(nmr)
+            for stop in [True, False]:
+                orderDF, costDF = order_brute_dfs(nmr, stop=stop)
+                self.assertEqual(costBF, costDF)
+            orderDF, costDF = order_brute_dfs(nmr, nproc=2)
+            self.assertEqual(costBF, costDF)
+            self.assertEqual(order_cost(orderDF, nmr.E, nmr.S), costDF)
+
+    def test_shared_huge(self):
+        fnmr = os.path.join(self.tmp, "huge.nmr")
+        with open(fnmr, "w") as fid:
+            for i, j in [(1, 5), (1, 7), (1, 66)]:
+                fid.write("%3d %3d 1 1 X X PRO PRO\n" % (i, j))
+        nmr = NMR(fnmr)
+        orderOPT, costOPT = order_brute(nmr)
+        # the float of a worse incumbent is below the optimum (2**59 + 8)
+        self.assertLess(float(costOPT + 1), costOPT)
+        shared = SharedBound()
+        shared.put(costOPT + 1)
+        self.assertEqual(brute_search(nmr.E, nmr.S, (), np.inf, -1, shared)[1], costOPT)
+
+
+class TestDP(RandomNMRCase):
+    def test_nmr_test(self):
+        wdir = os.path.join("data", "nmr_test")
+        for fn in sorted(os.listdir(wdir)):
+            if not fn.endswith(".nmr"):
+                continue
+            nmr = NMR(os.path.join(wdir, fn))
+            orderBF, costBF = order_brute(nmr)
+            for useUB in [True, False]:
+                orderDP, costDP = order_dp(nmr, useUB=useUB)
+                self.assertEqual(costBF, costDP)
+                self.assertEqual(order_cost(orderDP, nmr.E, nmr.S), costDP)
+
+    def test_random(self):
+        for seed in range(5):
+            fnmr = self.random_fnmr(40, 9, seed, "rand%d.nmr" % seed)
+            nmr = NMR(fnmr)
+            orderBF, costBF = order_brute_dfs(nmr)
+            orderDP, costDP = order_dp(nmr)
+            self.assertEqual(costBF, costDP)
+            self.assertEqual(sorted(orderDP), sorted(nmr.E))
+            self.assertEqual(order_cost(orderDP, nmr.E, nmr.S), costDP)
+        self.assertRaises(ValueError, order_dp, nmr, max_edges=8)
+
+    def test_huge(self):
+        # costs above 2**62 (object arithmetic), SBBU is not optimal on the second one
+        for k, E in enumerate([[(1, 70), (2, 75)], [(1, 70), (2, 70), (5, 80), (8, 77), (8, 78), (16, 91)]]):
+            fnmr = os.path.join(self.tmp, "huge%d.nmr" % k)
+            with open(fnmr, "w") as fid:
+                for i, j in E:
+                    fid.write("%3d %3d 1 1 X X PRO PRO\n" % (i, j))
+            nmr = NMR(fnmr)
+            orderBF, costBF = order_brute_dfs(nmr)
+            self.assertGreater(costBF, 2**62)
+            for useUB in [True, False]:
+                orderDP, costDP = order_dp(nmr, useUB=useUB)
+                self.assertEqual(costDP, costBF)
+                self.assertEqual(order_cost(orderDP, nmr.E, nmr.S), costBF)
+
+
+class TestWarmStart(unittest.TestCase):
+    def test_map(self):
+        nmr4 = NMR(os.path.join("data", "nmr", "1bdo_chain_A_dmax_4.nmr"))
+        nmr5 = NMR(os.path.join("data", "nmr", "1bdo_chain_A_dmax_5.nmr"))
+        order4, cost4 = order_greedy(nmr4)
+        pairs = [(nmr4.E[eid].i, nmr4.E[eid].j) for eid in order4]
+        order5, cost5 = order_warm_start(nmr5, pairs)
+        self.assertEqual(sorted(order5), sorted(nmr5.E))
+        self.assertEqual(order_cost(order5, nmr5.E, nmr5.S), cost5)
+        # the mapped edges keep their relative order
+        mapped = [(nmr5.E[eid].i, nmr5.E[eid].j) for eid in order5]
+        self.assertEqual([ij for ij in mapped if ij in pairs], [ij for ij in pairs if ij in mapped])
+        # the SBBU order is mapped to itself
+        orderSB, costSB = order_sbbu(nmr5)
+        pairs = [(nmr5.E[eid].i, nmr5.E[eid].j) for eid in orderSB[::2]]
+        self.assertEqual(order_warm_start(nmr5, pairs), (orderSB, costSB))
+
+    def test_solvers(self):
+        wdir = os.path.join("data", "nmr_test")
+        for fn in sorted(os.listdir(wdir)):
+            if not fn.endswith(".nmr"):
+                continue
+            nmr = NMR(os.path.join(wdir, fn))
+            orderOPT, costOPT = order_brute(nmr)
+            warm = [(nmr.E[eid].i, nmr.E[eid].j) for eid in orderOPT]
+            bb = BB(nmr)
+            self.assertEqual(bb.solve(warm=warm)[1], costOPT)
+            self.assertEqual(bb.costWS, costOPT)
+            pt = PriorityTree(nmr)
+            self.assertEqual(pt.solve(warm=warm)[1], costOPT)
+            self.assertEqual(pt.costWS, costOPT)
+
+
+class TestAnytime(unittest.TestCase):
+    def test_iter_solve(self):
+        wdir = os.path.join("data", "nmr_test")
+        for fn in sorted(os.listdir(wdir)):
+            if not fn.endswith(".nmr"):
+                continue
+            nmr = NMR(os.path.join(wdir, fn))
+            orderOPT, costOPT = order_brute(nmr)
+            for solver in [BB(nmr), PriorityTree(nmr)]:
+                costs = []
+                for order, cost, elapsed, costLB in solver.iter_solve():
+                    self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+                    self.assertLessEqual(costLB, cost)
+                    costs.append(cost)
+                # strictly improving costs up to the optimal one
+                self.assertEqual(costs, sorted(set(costs), reverse=True))
+                self.assertEqual(costs[-1], costOPT)
+                self.assertEqual(solver.costLB, costOPT)
+
+    def test_cancel(self):
+        nmr = NMR(os.path.join("data", "nmr", "1adx_chain_A_dmax_4.nmr"))
+        for solver in [BB(nmr), PriorityTree(nmr)]:
+            tic = time.time()
+            # stop at the first solution
+            order, cost = solver.solve(tmax=30, callback=lambda *incumbent: True)
+            self.assertLess(time.time() - tic, 5)
+            self.assertEqual(cost, order_sbbu(nmr)[1])
+            self.assertFalse(solver.timeout)
+
+
+class TestIncidence(unittest.TestCase):
+    def test_ordering_graph(self):
+        wdir = os.path.join("data", "nmr")
+        for fn in ["1adx_chain_A_dmax_4.nmr", "1all_chain_A_dmax_4.nmr", "1bdo_chain_A_dmax_5.nmr"]:
+            nmr = NMR(os.path.join(wdir, fn))
+            A, eids, sids = nmr.incidence()
+            for k, eid in enumerate(eids):
+                self.assertEqual(set(sids[A[k].indices]), nmr.E[eid].sid)
+            G = nmr.ordering_graph()
+            CG = sorted(sorted(int(v) for v in c if ":" not in v) for c in nx.connected_components(G))
+            self.assertEqual(nmr.components(), CG)
+            stats = nmr.structure_stats()
+            self.assertEqual(stats["ncomp"], len(CG))
+            self.assertEqual(sum(stats["largest"]), max(len(c) for c in nx.connected_components(G)))
+            degS = [G.degree("%d:%d" % (nmr.S[sid].i, nmr.S[sid].j)) for sid in sids]
+            self.assertEqual(list(stats["degS"]), list(np.bincount(degS)))
+            for k, eid in enumerate(eids):
+                shared = {e for sid in nmr.E[eid].sid for e in nmr.S[sid].eid}
+                self.assertEqual(stats["overlaps"][k], len(shared) - 1)
+
+
+class TestBlockCache(RandomNMRCase):
+    def test_solve_blocks(self):
+        fnmr = self.random_fnmr(30, 10, 0)
+        costOPT = order_dp(NMR(fnmr))[1]
+        # a shifted and a mirrored copy of the instance (the same blocks)
+        with open(fnmr, "r") as fid:
+            E = [tuple(int(x) for x in row.split()[:2]) for row in fid]
+        E += [(i + 40, j + 40) for i, j in E[:10]] + [(113 - j, 113 - i) for i, j in E[:10]]
+        fnmr = os.path.join(self.tmp, "copies.nmr")
+        with open(fnmr, "w") as fid:
+            for i, j in sorted(E):
+                fid.write("%3d %3d 1 1 X X PRO PRO\n" % (i, j))
+        nmr = NMR(fnmr)
+        fcache = os.path.join(self.tmp, "blocks.sqlite")
+        for solver in ["PT", "BB"]:
+            cache = BlockCache(fcache)
+            order, cost, optimal = solve_blocks(nmr, solver, 60, cache)
+            self.assertEqual(cost, 3 * costOPT)
+            self.assertTrue(optimal)
+            self.assertEqual(sorted(order), sorted(nmr.E))
+            self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+            # the copies (and the blocks of the first run) are not solved again
+            self.assertEqual(cache.misses, 1 if solver == "PT" else 0)
+            self.assertGreaterEqual(cache.hits, 2)
+            cache.close()
+        self.assertEqual(solve_blocks(nmr, "PT", 60)[1], 3 * costOPT)
+
+
+class TestOrderCostBatch(unittest.TestCase):
+    def test_order_cost(self):
+        rng = np.random.default_rng(0)
+        wdir = os.path.join("data", "nmr")
+        for fn in ["1adx_chain_A_dmax_4.nmr", "1adx_chain_A_dmax_5.nmr", "1bdo_chain_A_dmax_6.nmr"]:
+            nmr = NMR(os.path.join(wdir, fn))
+            eids = np.array(sorted(nmr.E))
+            orders = np.array([rng.permutation(eids) for _ in range(20)] + [order_sbbu(nmr)[0]])
+            costs = order_cost_batch(nmr, orders, chunk_size=1000)
+            self.assertEqual(list(costs), [order_cost(order, nmr.E, nmr.S) for order in orders])
+            # partial orders
+            costs = order_cost_batch(nmr, orders[:, :len(eids) // 3])
+            self.assertEqual(list(costs), [order_cost(order, nmr.E, nmr.S) for order in orders[:, :len(eids) // 3]])
+
+
+class TestBranching(RandomNMRCase):
+    def test_optimality(self):
+        for seed in range(3):
+            nmr, costOPT = self.random_instance(30, 9, seed)
+            for branching in BB_BRANCHING:
+                bb = BB(nmr, branching)
+                order, cost = bb.solve(tmax=30)
+                self.assertEqual(cost, costOPT)
+                self.assertEqual(sorted(order), sorted(nmr.E))
+                self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+                self.assertFalse(bb.timeout)
+        self.assertRaises(ValueError, BB, nmr, "random")
+
+    def test_por(self):
+        for seed in range(3):
+            nmr, costOPT = self.random_instance(40, 9, seed)
+            for branching in BB_BRANCHING:
+                bb = BB(nmr, branching, por=False)
+                bb.solve(tmax=30)
+                nodes = bb.nodes
+                bb = BB(nmr, branching, por=True)
+                order, cost = bb.solve(tmax=30)
+                self.assertEqual(cost, costOPT)
+                self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+                self.assertLessEqual(bb.nodes, nodes)
+
+    def test_rank(self):
+        # the first leaf of a static branching follows its order
+        nmr, costOPT = self.random_instance(30, 9, 0)
+        E = nmr.E
+        orders = {'eid': sorted(E),
+                  'sbbu': [int(eid) for eid in order_sbbu(nmr)[0]],
+                  'greedy': [int(eid) for eid in order_greedy(nmr)[0]],
+                  'segments': sorted(E, key=lambda eid: (-len(E[eid].sid), eid))}
+        for branching, order in orders.items():
+            bb = BB(nmr, branching)
+            self.assertEqual([bb.perm.next() for _ in range(bb.nedges)], order)
+
+    def test_nodes(self):
+        # ranking by the cost of the children visits fewer nodes than by eid
+        nodes = {branching: 0 for branching in BB_BRANCHING}
+        for seed in range(4):
+            nmr, costOPT = self.random_instance(30, 9, seed)
+            count = {}
+            for branching in BB_BRANCHING:
+                bb = BB(nmr, branching, por=False)
+                bb.solve(tmax=30)
+                count[branching] = bb.nodes
+                nodes[branching] += bb.nodes
+            self.assertLessEqual(count['greedy'], count['eid'])
+            self.assertLessEqual(count['cheapest'], count['eid'])
+        self.assertLess(nodes['greedy'], nodes['eid'])
+        self.assertLess(nodes['cheapest'], nodes['eid'])
+
+
+class TestBestFirst(RandomNMRCase):
+    def test_optimality(self):
+        for seed in range(3):
+            nmr, costOPT = self.random_instance(30, 10, seed)
+            # without memory the search is a DFS from the root
+            for max_memory in [BF_MAX_MEMORY, 2000, 0]:
+                bb = BB(nmr)
+                order, cost = bb.solve_best_first(tmax=30, max_memory=max_memory)
+                self.assertEqual(cost, costOPT)
+                self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+                self.assertEqual(bb.costLB, costOPT)
+                self.assertEqual(bb.gap, 0)
+                self.assertEqual(bb.hybrid, max_memory < BF_MAX_MEMORY)
+
+    def test_memory_cap(self):
+        # a tighter cap stores fewer nodes, the DFS fallback still proves the optimum
+        nmr, costOPT = self.random_instance(40, 14, 0)
+        bbF = BB(nmr)
+        bbF.solve_best_first(tmax=30)
+        self.assertFalse(bbF.hybrid)
+        bbH = BB(nmr)
+        self.assertEqual(bbH.solve_best_first(tmax=30, max_memory=bbF.memory // 4)[1], costOPT)
+        self.assertTrue(bbH.hybrid)
+        self.assertLess(bbH.memory, bbF.memory)
+
+    def test_gap(self):
+        nmr = NMR(os.path.join("data", "nmr", "1adx_chain_A_dmax_4.nmr"))
+        bb = BB(nmr)
+        order, cost = bb.solve_best_first(tmax=1)
+        self.assertTrue(bb.timeout)
+        self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+        self.assertLessEqual(cost_relax(nmr.S, nmr.S), bb.costLB)
+        self.assertLessEqual(bb.costLB, cost)
+        self.assertAlmostEqual(bb.gap, (cost - bb.costLB) / cost)
+
+
+class TestLDS(RandomNMRCase):
+    def test_optimality(self):
+        for seed in range(3):
+            nmr, costOPT = self.random_instance(30, 12, seed)
+            for heuristic, solver in [("sbbu", order_sbbu), ("greedy", order_greedy)]:
+                incumbents = []
+                bb = BB(nmr)
+                order, cost = bb.solve_lds(tmax=60, heuristic=heuristic, callback=lambda *args: incumbents.append(args[1:]) and False)
+                self.assertEqual(cost, costOPT)
+                self.assertEqual(bb.costLB, costOPT)
+                self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+                # the first incumbent is the heuristic order (k = -1)
+                self.assertEqual(incumbents[0][0], solver(nmr)[1])
+                self.assertEqual(incumbents[0][2], -1)
+                self.assertTrue(all(a[0] > b[0] and a[2] <= b[2] for a, b in zip(incumbents, incumbents[1:])))
+
+    def test_discrepancies(self):
+        nmr, costOPT = self.random_instance(30, 12, 0)
+        bb = BB(nmr)
+        order = [int(eid) for eid in order_sbbu(nmr)[0]]
+        rank = {eid: k for k, eid in enumerate(order)}
+        # without discrepancies the iteration is a single path down to a leaf
+        bb.nodes, bb.costUB = 0, order_cost(order, nmr.E, nmr.S) + 1
+        self.assertTrue(bb.lds(0, rank, time.time(), 60))
+        self.assertEqual(bb.nodes, bb.nedges)
+        self.assertEqual(order_cost(bb.orderOPT, nmr.E, nmr.S), bb.costUB)
+        # stopping at the first improvement leaves the iteration incomplete
+        bb = BB(nmr)
+        order, cost = bb.solve_lds(tmax=60, callback=lambda order, cost, elapsed, k: k >= 0)
+        self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+        if cost > costOPT:
+            self.assertLess(bb.costLB, cost)
+
+
+class TestPairwise(RandomNMRCase):
+    def test_forced(self):
+        increments = 0
+        for seed in range(3):
+            nmr, costOPT = self.random_instance(30, 12, seed)
+            pairs = set(nmr.overlapping_pairs())
+            for a, b in itertools.combinations(sorted(nmr.E), 2):
+                self.assertEqual((a, b) in pairs, bool(nmr.E[a].sid & nmr.E[b].sid))
+            pred = forced_precedences(nmr, pairs)
+            for b in pred:
+                for a in pred[b]:
+                    # forced pairs overlap and the segments of a are the ones of b or fewer
+                    self.assertIn((min(a, b), max(a, b)), pairs)
+                    self.assertTrue(nmr.E[a].sid <= nmr.E[b].sid)
+            # the bound of relax_weights is valid and not weaker than cost_relax
+            W = relax_weights(nmr)
+            self.assertGreaterEqual(sum(W.values()), cost_relax(nmr.S, nmr.S))
+            self.assertLessEqual(sum(W.values()), costOPT)
+            # the pairwise costs cover the overlapping pairs and their increments keep it valid
+            D = pairwise_costs(nmr, pred)
+            self.assertEqual(set(D), pairs)
+            self.assertTrue(all(min(ab, ba) >= own for ab, ba, own in D.values()))
+            inc = pairwise_increments(nmr, D)
+            used = [eid for a, b, d in inc for eid in (a, b)]
+            self.assertEqual(len(used), len(set(used)))
+            costLB = sum(W.values()) + sum(d for a, b, d in inc)
+            self.assertLessEqual(costLB, costOPT)
+            self.assertEqual(BB(nmr, pairwise=True).relax(set(nmr.S)), costLB)
+            increments += len(inc)
+            # some optimal order respects all the forced precedences
+            bb = BB(nmr, pairwise=True)
+            order, cost = bb.solve(tmax=60)
+            self.assertEqual(cost, costOPT)
+            position = {int(eid): k for k, eid in enumerate(order)}
+            self.assertTrue(all(position[a] < position[b] for b in pred for a in pred[b]))
+        # seed 2 has a pair whose shared class raises the bound
+        self.assertGreater(increments, 0)
+
+    def test_optimality(self):
+        for seed in range(5):
+            nmr, costOPT = self.random_instance(30, 12, seed)
+            for branching in BB_BRANCHING:
+                order, cost = BB(nmr, branching, pairwise=True).solve(tmax=60)
+                self.assertEqual(cost, costOPT)
+                self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+            pt = PriorityTree(nmr, pairwise=True)
+            order, cost = pt.solve(tmax=60)
+            self.assertEqual(cost, costOPT)
+            self.assertEqual(pt.costLB, costOPT)
+            self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+
+
+class TestSelect(RandomNMRCase):
+    def test_optimality(self):
+        for seed in range(5):
+            nmr, costOPT = self.random_instance(30, 12, seed)
+            for select in PT_SELECT:
+                for pairwise in [False, True]:
+                    pt = PriorityTree(nmr, pairwise=pairwise, select=select)
+                    order, cost = pt.solve(tmax=60)
+                    self.assertEqual(cost, costOPT)
+                    self.assertEqual(pt.costLB, costOPT)
+                    self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+                    # ordS is still a permutation of the segments
+                    self.assertEqual(sorted(pt.ordS), sorted(nmr.S))
+        with self.assertRaises(ValueError):
+            PriorityTree(nmr, select="random")
+
+    def test_avail(self):
+        # the available edges kept for the fewest rule match a recomputation from G
+        for seed in range(3):
+            nmr, costOPT = self.random_instance(30, 12, seed)
+            pt = PriorityTree(nmr, select="fewest")
+            for order, cost, elapsed, costLB in pt.iter_solve(tmax=60):
+                if pt.avail is not None:
+                    for sid in nmr.S:
+                        self.assertEqual(pt.avail[sid], pt.available_edges(list(nmr.S[sid].eid)))
+            self.assertEqual(cost, costOPT)
+            # every level undone on backtracking
+            self.assertEqual(pt.avail_undo, {})
+            for sid in nmr.S:
+                self.assertEqual(pt.avail[sid], pt.available_edges(list(nmr.S[sid].eid)))
+
+    def test_resume(self):
+        nmr = NMR(self.random_fnmr(30, 14, 0))
+        pt = PriorityTree(nmr, select="fewest")
+        ref = [(order, cost) for order, cost, elapsed, costLB in pt.iter_solve(tmax=60)]
+        fckpt = os.path.join(self.tmp, "rand_PT.ckpt")
+        incumbents, nslices = [], 0
+        while True:
+            pt = PriorityTree(nmr, select="fewest")
+            incumbents += [(order, cost) for order, cost, elapsed, costLB in pt.iter_solve(tmax=0.05, checkpoint=fckpt)][(nslices > 0):]
+            nslices += 1
+            if not pt.timeout:
+                break
+        self.assertGreater(nslices, 1)
+        self.assertEqual(incumbents, ref)
+        # the static order does not resume a dynamic search
+        with self.assertRaises(ValueError):
+            PriorityTree(nmr).solve(tmax=60, checkpoint=fckpt)
+
+
+class TestSolveCLI(RandomNMRCase):
+    def test_deferred_imports(self):
+        # a fresh interpreter: the heuristics do not load the modules of the other solvers
+        code = ("import sys, bb; nmr = bb.NMR('data/nmr_test/testA_chain_A_dmax_5.nmr'); "
+                "bb.order_sbbu(nmr); bb.order_greedy(nmr); "
+                "print(','.join(m for m in ['networkx', 'scipy', 'multiprocessing', 'sqlite3'] if m in sys.modules)); "
+                "bb.PriorityTree(nmr); print('networkx' in sys.modules)")
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.split(), ["True"])
+
+    def test_main(self):
+        fnmr = self.random_fnmr(30, 12, 0)
+        fout = os.path.join(self.tmp, "results.jsonl")
+        results = solve.main([self.tmp, "-s", "SB,DP,PT", "-t", "60", "-o", fout])
+        self.assertEqual([result["solver"] for result in results], ["SB", "DP", "PT"])
+        nmr = NMR(fnmr)
+        self.assertEqual(results[0]["cost"], order_sbbu(nmr)[1])
+        self.assertTrue(results[1]["optimal"] and results[2]["optimal"])
+        self.assertEqual(results[2]["cost"], results[1]["cost"])
+        for result in results:
+            self.assertEqual(order_cost(result["order"], nmr.E, nmr.S), result["cost"])
+        with open(fout, "r") as fid:
+            self.assertEqual(len(fid.readlines()), 3)
+        with self.assertRaises(SystemExit):
+            solve.parse_args([fnmr, "-s", "XX"])
+
+    def test_skip_dp(self):
+        # DP skips the instances beyond DP_MAX_EDGES (in solve.py and in the job queue)
+        fnmr = self.random_fnmr(60, DP_MAX_EDGES + 1, 0, "big.nmr")
+        self.random_fnmr(30, 10, 0)
+        results = solve.main([self.tmp, "-s", "DP,SB"])
+        self.assertEqual([(os.path.basename(r["fnmr"]), r["solver"]) for r in results],
+                         [("rand.nmr", "DP"), ("rand.nmr", "SB"), ("big.nmr", "SB")])
+        job = {"solver": "DP", "tmax": 10, "elapsed": 0}
+        self.assertIn("skipped", run_queue.solve_job(job, fnmr, None))
+
+
+class TestCheckpoint(RandomNMRCase):
+    def test_resume(self):
+        nmr = NMR(self.random_fnmr(30, 14, 0))
+        pt = PriorityTree(nmr)
+        ref = [(order, cost) for order, cost, elapsed, costLB in pt.iter_solve(tmax=60)]
+        # the same search split in short time slices
+        fckpt = os.path.join(self.tmp, "rand_PT.ckpt")
+        incumbents, nslices = [], 0
+        while True:
+            pt = PriorityTree(nmr)
+            incumbents += [(order, cost) for order, cost, elapsed, costLB in pt.iter_solve(tmax=0.05, checkpoint=fckpt)][(nslices > 0):]
+            nslices += 1
+            if not pt.timeout:
+                break
+        self.assertGreater(nslices, 1)
+        self.assertEqual(incumbents, ref)
+        self.assertEqual(pt.costLB, ref[-1][1])
+        # a completed search is not repeated
+        pt = PriorityTree(nmr)
+        self.assertEqual(pt.solve(checkpoint=fckpt)[1], ref[-1][1])
+        self.assertEqual(pt.costLB, ref[-1][1])
+        # checkpoint of another instance
+        other = NMR(self.random_fnmr(30, 14, 1, "other.nmr"))
+        self.assertRaises(ValueError, PriorityTree(other).solve, checkpoint=fckpt)
+        # checkpoint of other options
+        for kwargs in [{'pairwise': True}, {'nogood_size': 0}, {'select': 'fewest'}]:
+            self.assertRaises(ValueError, PriorityTree(nmr, **kwargs).solve, checkpoint=fckpt)
+
+    def test_resume_bb(self):
+        nmr = NMR(self.random_fnmr(40, 15, 1))
+        ref = [(order, cost) for order, cost, elapsed, costLB in BB(nmr).iter_solve(tmax=60)]
+        # the state is saved on each timeout
+        incumbents, nslices = [], 0
+        while True:
+            bb = BB(nmr)
+            incumbents += [(order, cost) for order, cost, elapsed, costLB in bb.iter_solve(unpickling=nslices > 0, tmax=0.1, dump=True)][(nslices > 0):]
+            nslices += 1
+            if not bb.timeout:
+                break
+        self.assertGreater(nslices, 1)
+        self.assertEqual(incumbents, ref)
+        self.assertEqual(bb.costLB, ref[-1][1])
+        # state of another branching
+        self.assertRaises(ValueError, BB(nmr, "sbbu").solve, unpickling=True)
+        # the state is saved only when asked
+        os.remove(os.path.join(self.tmp, "rand.pkl"))
+        bb = BB(nmr)
+        bb.solve(tmax=0.01)
+        self.assertTrue(bb.timeout)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "rand.pkl")))
+
+    def test_resume_cheapest(self):
+        nmr = NMR(self.random_fnmr(35, 13, 1))
+        ref = [(order, cost) for order, cost, elapsed, costLB in BB(nmr, "cheapest").iter_solve(tmax=60)]
+        # the children of the resumed path are sorted again on load
+        incumbents, nslices = [], 0
+        while True:
+            bb = BB(nmr, "cheapest")
+            incumbents += [(order, cost) for order, cost, elapsed, costLB in bb.iter_solve(unpickling=nslices > 0, tmax=0.1, dump=True)][(nslices > 0):]
+            nslices += 1
+            if not bb.timeout:
+                break
+        self.assertGreater(nslices, 1)
+        self.assertEqual(incumbents, ref)
+        self.assertEqual(bb.costLB, ref[-1][1])
+
+
+class TestJobQueue(RandomNMRCase):
+    def test_lease(self):
+        fnmr = self.random_fnmr(30, 10, 0)
+        queue = run_queue.JobQueue([{"fnmr": fnmr, "solver": "BB", "tmax": 10}], lease=0.2)
+        job = queue.lease("A")
+        self.assertIsNone(queue.lease("B"))
+        self.assertEqual(job["attempt"], 1)
+        self.assertFalse(queue.renew(job["jid"], job["token"] + 1))
+        self.assertTrue(queue.renew(job["jid"], job["token"], b"state", 3.0))
+        # A stops renewing the lease
+        time.sleep(0.3)
+        jobB = queue.lease("B")
+        self.assertEqual((jobB["jid"], jobB["attempt"]), (job["jid"], 2))
+        self.assertEqual((jobB["checkpoint"], jobB["elapsed"]), (b"state", 3.0))
+        self.assertFalse(queue.complete(job["jid"], job["token"], {"cost": 1}))
+        self.assertTrue(queue.complete(jobB["jid"], jobB["token"], {"cost": 2}))
+        self.assertTrue(queue.done())
+        self.assertEqual([result["cost"] for result in queue.take_results()], [2])
+        self.assertEqual(queue.take_results(), [])
+
+    def test_workers(self):
+        fnmrA = self.random_fnmr(40, 15, 1, "randA.nmr")
+        fnmrB = self.random_fnmr(30, 10, 0, "randB.nmr")
+        jobs = [{"fnmr": fnmrA, "solver": "BB", "tmax": 60}]
+        jobs += [{"fnmr": fnmrB, "solver": solver, "tmax": 60} for solver in ["GD", "PT", "BB"]]
+        queue = run_queue.JobQueue(jobs, lease=1)
+        authkey = os.urandom(16)
+        server = run_queue.serve(queue, ("127.0.0.1", 0), authkey)
+        self.addCleanup(run_queue.stop, server)
+        args = (server.address, authkey)
+        # a worker dies after sending a checkpoint of the first job
+        dead = mp.Process(target=run_queue.run_worker, args=args + ("dead", 1, 0.1, 0.05))
+        dead.start()
+        tic = time.time()
+        while 0 not in queue.state and time.time() - tic < 30:
+            time.sleep(0.01)
+        dead.kill()
+        dead.join()
+        self.assertIn(0, queue.state)
+        workers = [mp.Process(target=run_queue.run_worker, args=args + ("W%d" % k, 1, 0.5, 0.05)) for k in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+        self.assertTrue(queue.done())
+        costDP = {fnmr: order_dp(NMR(fnmr))[1] for fnmr in [fnmrA, fnmrB]}
+        for jid, result in queue.results.items():
+            nmr = NMR(result["fnmr"])
+            self.assertEqual(order_cost(result["order"], nmr.E, nmr.S), result["cost"])
+            if result["solver"] != "GD":
+                self.assertEqual(result["cost"], costDP[result["fnmr"]])
+                self.assertTrue(result["optimal"])
+        self.assertEqual(queue.results[0]["attempts"], 2)
+        self.assertNotEqual(queue.results[0]["worker"], "dead")
+
+
+class TestPTParallel(RandomNMRCase):
+    def test_subtrees(self):
+        nmr, costOPT = self.random_instance(30, 12, 0)
+        # the subtrees of the children cover the whole search
+        costs = []
+        for prefix in PriorityTree(nmr).children([]):
+            pt = PriorityTree(nmr)
+            order, cost = pt.solve(tmax=60, prefix=prefix)
+            self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+            costs.append(cost)
+        self.assertEqual(min(costs), costOPT)
+
+    def test_solve(self):
+        nmr, costOPT = self.random_instance(40, 15, 0)
+        # short slices split the subtrees while they are searched
+        for depth, slice in [(None, 0.05), (1, 60)]:
+            order, cost, optimal = solve_pt_parallel(nmr, tmax=60, nproc=2, depth=depth, slice=slice)
+            self.assertEqual(cost, costOPT)
+            self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+            self.assertTrue(optimal)
+
+    def test_unexplored(self):
+        # the subtrees left on timeout and the best order found cover the whole search
+        nmr, costOPT = self.random_instance(40, 15, 0)
+        pt = PriorityTree(nmr)
+        order, cost = pt.solve(tmax=0.01, prefix=[])
+        self.assertTrue(pt.timeout)
+        self.assertGreater(len(pt.unexplored), 0)
+        self.assertTrue(all(len(prefix) <= 1 for prefix in pt.unexplored))
+        costs = [cost]
+        for prefix in pt.unexplored:
+            sub = PriorityTree(nmr)
+            costs.append(sub.solve(tmax=60, prefix=prefix)[1])
+            self.assertEqual(sub.unexplored, [])
+        self.assertEqual(min(costs), costOPT)
+
+
+class TestNogood(RandomNMRCase):
+    def test_optimality(self):
+        hits = 0
+        for seed in range(3):
+            nmr, costOPT = self.random_instance(30, 12, seed)
+            pt = PriorityTree(nmr, nogood_size=0)
+            pt.solve(tmax=60)
+            nodes = pt.nodes
+            # a tiny cache exercises the LRU eviction
+            for nogood_size in [NOGOOD_SIZE, 16]:
+                pt = PriorityTree(nmr, nogood_size=nogood_size)
+                order, cost = pt.solve(tmax=60)
+                self.assertEqual(cost, costOPT)
+                self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+                self.assertLessEqual(pt.nodes, nodes)
+                # each hit skips a subtree searched before
+                if pt.nogood_hits > 0:
+                    self.assertLess(pt.nodes, nodes)
+                self.assertLessEqual(len(pt.nogood), nogood_size)
+                self.assertEqual(sum(pt.nogood_index.values()), len(pt.nogood))
+                hits += pt.nogood_hits
+        self.assertGreater(hits, 0)
+
+    def test_lru(self):
+        nmr, costOPT = self.random_instance(30, 12, 0)
+        pt = PriorityTree(nmr, nogood_size=2)
+        keys = [(level, frozenset()) for level in range(3)]
+        for costLB, key in enumerate(keys):
+            pt.nogood_put(key, costLB)
+        # the least recently used entry is evicted
+        self.assertIsNone(pt.nogood_get(keys[0]))
+        self.assertEqual(pt.nogood_get(keys[1]), 1)
+        pt.nogood_put(keys[0], 5)
+        self.assertIsNone(pt.nogood_get(keys[2]))
+        self.assertEqual(pt.nogood_get(keys[1]), 1)
+        # a second bound of the same state keeps the largest one
+        pt.nogood_put(keys[0], 3)
+        self.assertEqual(pt.nogood_get(keys[0]), 5)
+        self.assertEqual(sorted(pt.nogood_index), sorted(keys[:2]))
+
+
+class TestMemoryProbe(RandomNMRCase):
+    def test_log(self):
+        fnmr = self.random_fnmr(30, 10, 0)
+        call_solvers("-fnmr", fnmr, "-mem", "-dp", "-clean_log")
+        fields = {}
+        with open(fnmr.replace(".nmr", ".log")) as fid:
+            for row in fid:
+                fields[row.split()[1]] = row.split()[-1]
+        for phase in ["Parse", "Segments", "GD", "SB", "DP", "PT"]:
+            self.assertGreaterEqual(float(fields["mem" + phase]), 0)
+            self.assertIn("rss" + phase, fields)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_tracing(self):
+        # a probe does not stop the tracing of its caller
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        probe = MemoryProbe()
+        probe.start()
+        probe.stop("Phase")
+        probe.close()
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertGreaterEqual(probe.phases["Phase"][0], 0)
+
+
+class TestTrace(RandomNMRCase):
+    def test_record(self):
+        nmr = NMR(self.random_fnmr(30, 12, 0))
+        # BB branches on edges, PriorityTree on segments
+        for kind, solver, ndepth in [("BB", BB, len(nmr.E)), ("PT", PriorityTree, len(nmr.S))]:
+            ftrace = os.path.join(self.tmp, "rand_%s.trace" % kind)
+            # a tiny buffer exercises the block writes
+            with TraceWriter(ftrace, kind, buffer_size=7) as trace:
+                order, cost = solver(nmr).solve(tmax=60, trace=trace)
+            kindTR, A = read_trace(ftrace)
+            self.assertEqual(kindTR, kind)
+            inc = A[A["action"] == TRACE_INCUMBENT]
+            self.assertEqual(inc["depth"][0], -1)
+            self.assertEqual(inc["cost"][-1], cost)
+            self.assertTrue(np.all(np.diff(inc["cost"]) < 0))
+            self.assertGreater(np.sum(A["action"] == TRACE_BRANCH), 0)
+            self.assertLess(A["depth"].max(), ndepth)
+            # the same search with the default buffer
+            ftrace2 = os.path.join(self.tmp, "rand_%s_2.trace" % kind)
+            with TraceWriter(ftrace2, kind) as trace:
+                solver(nmr).solve(tmax=60, trace=trace)
+            B = read_trace(ftrace2)[1]
+            self.assertTrue(np.array_equal(A[["depth", "id", "action"]], B[["depth", "id", "action"]]))
+        self.assertRaises(ValueError, read_trace, nmr.fnmr)
+
+    def test_replay(self):
+        nmr = NMR(self.random_fnmr(30, 12, 1))
+        for kind, solver in [("BB", BB(nmr)), ("PT", PriorityTree(nmr, pairwise=True))]:
+            ftrace = os.path.join(self.tmp, "rand_%s.trace" % kind)
+            with TraceWriter(ftrace, kind) as trace:
+                solver.solve(tmax=60, trace=trace)
+            A = read_trace(ftrace)[1]
+            stats = replay_trace.trace_stats(A)
+            for k, action in enumerate(TRACE_ACTIONS):
+                self.assertEqual(stats[action], np.sum(A["action"] == k))
+            branch, prune = replay_trace.prunes_by_depth(A)
+            self.assertEqual((branch.sum(), prune.sum()), (stats["branch"], stats["prune"]))
+            # the recorded bound is the one compared: it prunes nothing more
+            ub = replay_trace.upper_bounds(A)
+            self.assertTrue(np.all(A["lb"][A["action"] == TRACE_BRANCH] < ub[A["action"] == TRACE_BRANCH]))
+            self.assertTrue(np.all(A["lb"][A["action"] == TRACE_PRUNE] >= ub[A["action"] == TRACE_PRUNE]))
+            self.assertEqual(replay_trace.replay_bound(A, replay_trace.replay_lb(A, "lb")), (0, 0, 0))
+            # an infinite bound cuts the branches of the root level and all the events below
+            nprunes, removed, lost = replay_trace.replay_bound(A, np.full(len(A), np.inf))
+            self.assertEqual(nprunes, branch[0])
+            self.assertEqual(removed, np.sum(A["depth"] > 0))
+            self.assertEqual(lost, np.sum((A["action"] == TRACE_INCUMBENT) & (A["depth"] > 0)))
+        self.assertRaises(ValueError, replay_trace.replay_lb, A, "lb * 2")
+
+
+class TestPortfolio(RandomNMRCase):
+    def test_shared_bound(self):
+        shared = SharedBound()
+        self.assertEqual(shared.get(), np.inf)
+        shared.put(2**60 + 1)
+        shared.put(2**61)
+        # rounded up, never below the best cost
+        self.assertGreaterEqual(shared.get(), 2**60 + 1)
+        self.assertFalse(shared.stopped())
+        shared.stop()
+        self.assertTrue(shared.stopped())
+        # exact below 2**53 (the members prune the nodes as costly as the incumbent)
+        shared = SharedBound()
+        shared.put(100)
+        self.assertEqual(shared.get(), 100)
+
+    def test_shared_pruning(self):
+        nmr, costOPT = self.random_instance(40, 14, 0)
+        for solver in [BB(nmr), PriorityTree(nmr)]:
+            shared = SharedBound()
+            shared.put(costOPT)
+            solver.solve(tmax=30, shared=shared)
+            # the optimal cost is proved even when it was found by another solver
+            self.assertEqual(solver.costLB, costOPT)
+            self.assertTrue(shared.stopped())
+
+    def test_solve_portfolio(self):
+        for seed in range(3):
+            nmr, costOPT = self.random_instance(30, 10, seed)
+            order, cost, winner, elapsed = solve_portfolio(nmr, tmax=30)
+            self.assertEqual(cost, costOPT)
+            self.assertEqual(order_cost(order, nmr.E, nmr.S), cost)
+            self.assertIn(winner, PORTFOLIO_SOLVERS)
+
+
 class TestGreedy(unittest.TestCase):
     def test_optimality(self):
         wdir = os.path.join("data", "nmr_test")
@@ -1,8 +1,7 @@
 import os
 import tqdm
 import numpy as np
-import networkx as nx
-from codes.bb import order_brute, order_greedy, NMR
+from codes.bb import order_brute_dfs, order_greedy, NMR
 
 def create_edges(nnodes, nedges):
     lenE, E = 0, {}
@@ -36,13 +35,12 @@ if __name__ == "__main__":
                     fid.write("%3d %3d 1 1 X X PRO PRO\n" % (i, j))
 
         nmr = NMR(fn)
-        orderBF, costBF = order_brute(nmr)
+        orderBF, costBF = order_brute_dfs(nmr)
         orderGD, costGD = order_greedy(nmr)
-        G = nmr.ordering_graph
 
         if costBF == costGD:
             os.remove(fn)
-        elif nx.number_connected_components(G) > 1:
+        elif len(nmr.components()) > 1:
             os.remove(fn)
         else:
             msg = "Found interesting instance (BF: %3d, GD: %3d, fn: %s)."
@@ -0,0 +1,112 @@
+# Statistics of a search trace recorded by BB.solve/PriorityTree.solve (trace=TraceWriter)
+# python replay_trace.py -ftrace <file> [-bound name] [-k value]
+# The alternative lower bound name (see REPLAY_BOUNDS), e.g. -bound scale -k 1.1,
+# estimates the events it would have pruned.
+
+import sys
+import numpy as np
+from codes.bb import read_trace, TRACE_ACTIONS, TRACE_BRANCH, TRACE_PRUNE, TRACE_INCUMBENT
+
+
+# alternative lower bounds of each event from the recorded ones (k: parameter)
+REPLAY_BOUNDS = {
+    'lb': lambda A, k: A['lb'],
+    'cost': lambda A, k: A['cost'],
+    'scale': lambda A, k: A['lb'] * k,
+    'shift': lambda A, k: A['lb'] + k,
+    'depth': lambda A, k: A['lb'] + k * A['depth'],
+}
+
+
+def replay_lb(A, name, k=1):
+    '''Alternative lower bound name of REPLAY_BOUNDS (one value per event).'''
+    if name not in REPLAY_BOUNDS:
+        raise ValueError('Unknown bound %s (options: %s)' % (name, ', '.join(REPLAY_BOUNDS)))
+    return np.asarray(REPLAY_BOUNDS[name](A, k), dtype=float)
+
+
+def upper_bounds(A):
+    '''Incumbent cost in effect at each event (before the event itself).'''
+    ub = np.where(A['action'] == TRACE_INCUMBENT, A['cost'], np.inf)
+    ub = np.minimum.accumulate(ub)
+    return np.concatenate(([np.inf], ub[:-1]))
+
+
+def trace_stats(A):
+    stats = {}
+    for k, action in enumerate(TRACE_ACTIONS):
+        stats[action] = int(np.sum(A['action'] == k))
+    stats['events'] = len(A)
+    stats['maxDepth'] = int(A['depth'].max()) if len(A) > 0 else -1
+    # fraction of the visited nodes cut by the bound
+    visited = stats['branch'] + stats['prune']
+    stats['pruneRatio'] = stats['prune'] / visited if visited > 0 else 0
+    inc = A[A['action'] == TRACE_INCUMBENT]
+    stats['costFirst'] = inc['cost'][0] if len(inc) > 0 else np.nan
+    stats['costLast'] = inc['cost'][-1] if len(inc) > 0 else np.nan
+    return stats
+
+
+def prunes_by_depth(A):
+    '''Number of branch and prune events at each depth.'''
+    depth = A['depth'][A['depth'] >= 0]
+    action = A['action'][A['depth'] >= 0]
+    nbins = int(depth.max()) + 1 if len(depth) > 0 else 0
+    branch = np.bincount(depth[action == TRACE_BRANCH], minlength=nbins)
+    prune = np.bincount(depth[action == TRACE_PRUNE], minlength=nbins)
+    return branch, prune
+
+
+def replay_bound(A, lbALT):
+    '''Replays the trace with the lower bound lbALT (one value per event): a branch event
+       with lbALT >= incumbent is pruned together with its subtree (the next events
+       deeper than it). Incumbents inside removed subtrees make the bound unsafe.
+       Returns the number of new prunes, removed events and lost incumbents.
+    '''
+    ub = upper_bounds(A)
+    cut = (A['action'] == TRACE_BRANCH) & (lbALT >= ub)
+    depth, action = A['depth'].tolist(), A['action'].tolist()
+    cut = cut.tolist()
+    nprunes, removed, lost, level = 0, 0, 0, None
+    for k in range(len(depth)):
+        if level is not None:
+            if depth[k] > level:
+                removed += 1
+                lost += action[k] == TRACE_INCUMBENT
+                continue
+            level = None
+        if cut[k]:
+            nprunes += 1
+            level = depth[k]
+    return nprunes, removed, lost
+
+
+if __name__ == "__main__":
+    ftrace = None
+    bound = None
+    k = 1
+    for i, arg in enumerate(sys.argv):
+        if arg == '-ftrace':
+            ftrace = sys.argv[i+1]
+        if arg == '-bound':
+            bound = sys.argv[i+1]
+        if arg == '-k':
+            k = float(sys.argv[i+1])
+    if ftrace is None:
+        print('Usage: python replay_trace.py -ftrace <file> [-bound %s] [-k value]' % '|'.join(REPLAY_BOUNDS))
+        sys.exit(1)
+
+    kind, A = read_trace(ftrace)
+    print('> kind .............. %s' % kind)
+    for field, value in trace_stats(A).items():
+        print('> %s %s %g' % (field, '.' * (18 - len(field)), value))
+    branch, prune = prunes_by_depth(A)
+    print('> depth     branch      prune')
+    for depth in range(len(branch)):
+        print('  %5d %10d %10d' % (depth, branch[depth], prune[depth]))
+    if bound is not None:
+        nprunes, removed, lost = replay_bound(A, replay_lb(A, bound, k))
+        print('> bound ............. %s (k = %g)' % (bound, k))
+        print('> newPrunes ......... %d' % nprunes)
+        print('> removedEvents ..... %d' % removed)
+        print('> lostIncumbents .... %d' % lost)
@@ -10,11 +10,14 @@ import cProfile, pstats
 if __name__ == "__main__":
     # set default params
     tmax = 30 # seconds
+    cache = False # if True, reuse the preprocessed instance (.npz)
     
     # read params
     for i, arg in enumerate(sys.argv):
         if arg == '-tmax':
             tmax = float(sys.argv[i+1])
+        if arg == '-cache':
+            cache = True
     
     print('Get git log')
     os.system('git log -1 > profiling/git_commit.txt')
@@ -22,7 +25,10 @@ if __name__ == "__main__":
     print('Call profiler')
     profiler = cProfile.Profile()
     profiler.enable()
-    call_solvers('-tmax', tmax, '-fnmr', 'profiling/data/4wua.nmr', '-clean_log')
+    args = ['-tmax', tmax, '-fnmr', 'profiling/data/4wua.nmr', '-clean_log']
+    if cache:
+        args.append('-cache')
+    call_solvers(*args)
     profiler.disable()
     
     fn = 'profiling/bb.stats'
@@ -0,0 +1,356 @@
+# Job queue for batch sweeps over several machines. The coordinator hands out
+# (instance, solver, tmax) jobs to the workers with leases and appends the results to a
+# jsonl file (jobs already there are skipped). A worker renews the lease of its job while
+# it runs and, for BB and PT, sends a checkpoint every slice seconds: when a worker dies
+# its lease expires and the job continues on another worker from the last checkpoint.
+#
+#
+# Trust: the coordinator and the workers unpickle what they receive (the requests of the
+# manager, the BB checkpoints relayed between workers), so whoever knows the authkey can
+# run code on all of them. Use a secret key, shared only with the workers of the sweep
+# (the coordinator prints a random one when -authkey is not given), and bind to a trusted
+# interface (default 127.0.0.1; -host 0.0.0.0 for remote workers on a private network).
+#
+# python run_queue.py coordinator -wdir <dirs> [-solvers BB,PT] [-tmax secs] [-fout file]
+#                                 [-host addr] [-port n] [-authkey key] [-lease secs]
+# python run_queue.py worker -host <coordinator> -authkey key [-port n] [-nproc n] [-slice secs]
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import secrets
+import tempfile
+import threading
+from collections import deque
+import multiprocessing as mp
+from multiprocessing.managers import BaseManager
+from codes.bb import *
+
+QUEUE_SOLVERS = ('GD', 'SB', 'DP', 'PT', 'BB', 'BF')
+# checkpoint file of the resumable solvers (suffix of the instance copy of the worker)
+QUEUE_CHECKPOINT = {'BB': '.pkl', 'PT': '_PT.ckpt'}
+QUEUE_HOST = '127.0.0.1'
+QUEUE_PORT = 50000
+# seconds without renewal before a job is handed to another worker
+LEASE = 60
+# seconds between two checkpoints sent to the coordinator
+SLICE = 60
+# seconds between two polls of the queue
+POLL = 1
+
+
+class JobQueue:
+    '''Jobs of a sweep shared by the coordinator with the workers (see serve).
+       Each lease gets a new token: the calls of a worker whose job was handed to
+       another one (expired lease) are rejected.
+    '''
+
+    def __init__(self, jobs, lease=LEASE) -> None:
+        '''jobs: list of dicts with fnmr, solver and tmax.'''
+        self.jobs = jobs
+        self.lease_time = lease
+        self.pending = deque(range(len(jobs)))
+        # leases[jid]: (worker, token, deadline)
+        self.leases = {}
+        # state[jid]: (checkpoint, elapsed) of the last slice
+        self.state = {}
+        self.attempts = [0 for _ in jobs]
+        self.results = {}
+        # results not written yet (see take_results)
+        self.new = []
+        self.token = 0
+        self.lock = threading.Lock()
+
+    def expire(self):
+        '''Put back the jobs whose lease was not renewed in time (dead workers).'''
+        now = time.time()
+        with self.lock:
+            for jid in [jid for jid, lease in self.leases.items() if lease[2] < now]:
+                print('> lease expired %s (%s)' % (self.jobs[jid], self.leases[jid][0]))
+                del self.leases[jid]
+                self.pending.appendleft(jid)
+
+    def lease(self, worker):
+        '''Next job (dict) for worker with the instance text, the lease token and the last
+           checkpoint, or None when no job is pending.
+        '''
+        self.expire()
+        with self.lock:
+            if len(self.pending) == 0:
+                return None
+            jid = self.pending.popleft()
+            self.token += 1
+            self.attempts[jid] += 1
+            self.leases[jid] = (worker, self.token, time.time() + self.lease_time)
+            job = dict(self.jobs[jid], jid=jid, token=self.token, attempt=self.attempts[jid])
+            job['checkpoint'], job['elapsed'] = self.state.get(jid, (None, 0))
+        with open(job['fnmr'], 'r') as fid:
+            job['nmr'] = fid.read()
+        return job
+
+    def valid(self, jid, token):
+        return jid in self.leases and self.leases[jid][1] == token
+
+    def renew(self, jid, token, checkpoint=None, elapsed=0):
+        '''Extend the lease and keep the checkpoint (bytes) of the job. False when the
+           lease was lost.
+        '''
+        with self.lock:
+            if not self.valid(jid, token):
+                return False
+            worker = self.leases[jid][0]
+            self.leases[jid] = (worker, token, time.time() + self.lease_time)
+            if checkpoint is not None:
+                self.state[jid] = (checkpoint, elapsed)
+            return True
+
+    def complete(self, jid, token, result):
+        with self.lock:
+            if not self.valid(jid, token):
+                return False
+            del self.leases[jid]
+            self.state.pop(jid, None)
+            self.results[jid] = dict(self.jobs[jid], attempts=self.attempts[jid], **result)
+            self.new.append(self.results[jid])
+            return True
+
+    def take_results(self):
+        '''Results completed since the last call.'''
+        with self.lock:
+            new, self.new = self.new, []
+            return new
+
+    def done(self):
+        with self.lock:
+            return len(self.results) == len(self.jobs)
+
+
+class QueueServer(BaseManager):
+    pass
+
+
+class QueueClient(BaseManager):
+    pass
+
+
+def serve(queue, address, authkey):
+    '''Serve queue on address (host, port) from a thread. Returns the server
+       (server.address is the address used, port 0 picks a free one).
+    '''
+    manager = QueueServer(address=address, authkey=authkey)
+    manager.register('get_queue', callable=lambda: queue)
+    server = manager.get_server()
+
+    def serve_forever():
+        try:
+            server.serve_forever()
+        except SystemExit:
+            # raised by serve_forever when it stops
+            pass
+
+    threading.Thread(target=serve_forever, daemon=True).start()
+    return server
+
+
+def stop(server):
+    # the listener is released on exit, until then the late workers still see done()
+    server.stop_event.set()
+
+
+def get_jobs(WDIR, solvers, tmax, fout=None):
+    '''Jobs for the instances of the folders WDIR (smallest first), but the ones
+       already in the results file fout.
+    '''
+    FNMR = []
+    for wdir in WDIR:
+        FNMR += [os.path.join(wdir, fn) for fn in os.listdir(wdir) if fn.endswith('.nmr')]
+    FNMR = sorted(FNMR, key=lambda fnmr: os.stat(fnmr).st_size)
+    solved = set()
+    if fout is not None and os.path.exists(fout):
+        with open(fout, 'r') as fid:
+            for row in fid:
+                result = json.loads(row)
+                solved.add((result['fnmr'], result['solver'], result['tmax']))
+    jobs = []
+    for fnmr in FNMR:
+        for solver in solvers:
+            if solver not in QUEUE_SOLVERS:
+                raise ValueError('Unknown solver %s (options: %s)' % (solver, ', '.join(QUEUE_SOLVERS)))
+            if (fnmr, solver, tmax) not in solved:
+                jobs.append({'fnmr': fnmr, 'solver': solver, 'tmax': tmax})
+    return jobs
+
+
+def run_coordinator(jobs, address, authkey, fout='results.jsonl', lease=LEASE, poll=POLL):
+    '''Serve the jobs until all of them are completed, appending the results to fout.'''
+    queue = JobQueue(jobs, lease)
+    server = serve(queue, address, authkey)
+    print('> coordinator %s:%d (%d jobs)' % (server.address[0], server.address[1], len(jobs)))
+    with open(fout, 'a') as fid:
+        while True:
+            queue.expire()
+            for result in queue.take_results():
+                fid.write(json.dumps(result) + '\n')
+                fid.flush()
+            if queue.done():
+                break
+            time.sleep(poll)
+    stop(server)
+    return queue.results
+
+
+def solve_job(job, fnmr, queue, slice=SLICE):
+    '''Solve the job on the instance copy fnmr, sending a checkpoint to the queue every
+       slice seconds (BB and PT). Returns the result or None when the lease was lost.
+    '''
+    solver, tmax, elapsed = job['solver'], job['tmax'], job['elapsed']
+    nmr = NMR(fnmr)
+    if solver == 'DP' and len(nmr.E) > DP_MAX_EDGES:
+        # recorded (not retried): the instance is beyond the reach of order_dp
+        return {'skipped': 'DP: %d edges > DP_MAX_EDGES = %d' % (len(nmr.E), DP_MAX_EDGES)}
+    if solver in QUEUE_CHECKPOINT:
+        fckpt = fnmr.replace('.nmr', QUEUE_CHECKPOINT[solver])
+        if job['checkpoint'] is not None:
+            with open(fckpt, 'wb') as fid:
+                fid.write(job['checkpoint'])
+        while True:
+            tic = time.time()
+            tslice = min(slice, tmax - elapsed)
+            if solver == 'BB':
+                search = BB(nmr)
+                order, cost = search.solve(unpickling=os.path.exists(fckpt), tmax=tslice, dump=True)
+            else:
+                search = PriorityTree(nmr)
+                order, cost = search.solve(tmax=tslice, checkpoint=fckpt)
+            elapsed += time.time() - tic
+            if not search.timeout or elapsed >= tmax:
+                break
+            with open(fckpt, 'rb') as fid:
+                if not queue.renew(job['jid'], job['token'], fid.read(), elapsed):
+                    return None
+        costLB, nodes = search.costLB, search.nodes
+    else:
+        tic = time.time()
+        costLB, nodes = None, None
+        if solver == 'GD':
+            order, cost = order_greedy(nmr)
+        elif solver == 'SB':
+            order, cost = order_sbbu(nmr)
+        elif solver == 'DP':
+            order, cost = order_dp(nmr)
+            costLB = cost
+        else:
+            search = BB(nmr)
+            order, cost = search.solve_best_first(tmax=tmax - elapsed)
+            costLB, nodes = search.costLB, search.nodes
+        elapsed += time.time() - tic
+    return {'cost': int(cost), 'costLB': None if costLB is None else int(costLB),
+            'optimal': bool(costLB is not None and costLB == cost), 'time': elapsed, 'nodes': nodes,
+            'order': [int(eid) for eid in order]}
+
+
+def run_job(queue, job, worker, lease=LEASE, slice=SLICE):
+    '''Run a leased job in a temporary folder, renewing the lease until it finishes.'''
+    wdir = tempfile.mkdtemp()
+    finished = threading.Event()
+
+    def heartbeat():
+        while not finished.wait(lease / 3):
+            if not queue.renew(job['jid'], job['token']):
+                break
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        fnmr = os.path.join(wdir, os.path.basename(job['fnmr']))
+        with open(fnmr, 'w') as fid:
+            fid.write(job['nmr'])
+        try:
+            result = solve_job(job, fnmr, queue, slice)
+        except Exception as e:
+            # reported instead of handing the job to the next worker
+            result = {'error': repr(e)}
+        if result is not None:
+            result['worker'] = worker
+            queue.complete(job['jid'], job['token'], result)
+    finally:
+        finished.set()
+        shutil.rmtree(wdir)
+
+
+def run_worker(address, authkey, worker=None, lease=LEASE, slice=SLICE, poll=POLL):
+    '''Solve the jobs of the coordinator at address until they are all done (or the
+       coordinator is gone).
+    '''
+    if worker is None:
+        worker = '%s:%d' % (socket.gethostname(), os.getpid())
+    manager = QueueClient(address=address, authkey=authkey)
+    manager.register('get_queue')
+    try:
+        manager.connect()
+        queue = manager.get_queue()
+        while True:
+            job = queue.lease(worker)
+            if job is not None:
+                run_job(queue, job, worker, lease, slice)
+            elif queue.done():
+                break
+            else:
+                time.sleep(poll)
+    except (EOFError, ConnectionError):
+        pass
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'help'
+    host = QUEUE_HOST
+    port = QUEUE_PORT
+    authkey = None
+    wdir = ['data/nmr_spec']
+    solvers = ['BB']
+    tmax = 7200
+    fout = 'results.jsonl'
+    lease = LEASE
+    slice = SLICE
+    nproc = 1
+    for i, arg in enumerate(sys.argv):
+        if arg == '-host':
+            host = sys.argv[i+1]
+        elif arg == '-port':
+            port = int(sys.argv[i+1])
+        elif arg == '-authkey':
+            authkey = sys.argv[i+1].encode()
+        elif arg == '-wdir':
+            wdir = sys.argv[i+1].split(',')
+        elif arg == '-solvers':
+            solvers = sys.argv[i+1].split(',')
+        elif arg == '-tmax':
+            tmax = float(sys.argv[i+1])
+        elif arg == '-fout':
+            fout = sys.argv[i+1]
+        elif arg == '-lease':
+            lease = float(sys.argv[i+1])
+        elif arg == '-slice':
+            slice = float(sys.argv[i+1])
+        elif arg == '-nproc':
+            nproc = int(sys.argv[i+1])
+
+    if mode == 'coordinator':
+        if authkey is None:
+            authkey = secrets.token_hex(16).encode()
+            print('> authkey %s (pass it to the workers with -authkey)' % authkey.decode())
+        jobs = get_jobs(wdir, solvers, tmax, fout)
+        run_coordinator(jobs, (host, port), authkey, fout, lease)
+    elif mode == 'worker':
+        if authkey is None:
+            sys.exit('The worker needs the -authkey of the coordinator')
+        # the lease time must match the one of the coordinator
+        workers = [mp.Process(target=run_worker, args=((host, port), authkey, None, lease, slice)) for _ in range(nproc)]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join()
+    else:
+        print('Usage: python run_queue.py coordinator|worker [options] (see the header of run_queue.py)')
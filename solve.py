@@ -0,0 +1,105 @@
+# Solvers of the command line with a fast start: codes/bb.py imports networkx, scipy,
+# multiprocessing, ... only in the functions using them, so a run of the heuristics
+# on small instances pays for numpy alone. Several instances (or folders) are solved
+# in a single process.
+# python solve.py <fnmr or folder> [...] [-s GD,SB] [-t secs] [-o results.jsonl]
+
+import os
+import sys
+import json
+import time
+import argparse
+from codes.bb import NMR, BB, PriorityTree, order_greedy, order_sbbu, order_dp, cost_relax, DP_MAX_EDGES
+
+# GD: greedy, SB: SBBU, DP: dynamic programming, PT: PriorityTree, BB: depth-first BB,
+# BF: best-first BB
+SOLVERS = ('GD', 'SB', 'DP', 'PT', 'BB', 'BF')
+
+
+def list_instances(paths):
+    '''Instances of paths (files or folders with .nmr files), smallest first.'''
+    FNMR = []
+    for path in paths:
+        if os.path.isdir(path):
+            FNMR += [os.path.join(path, fn) for fn in os.listdir(path) if fn.endswith('.nmr')]
+        else:
+            FNMR.append(path)
+    return sorted(FNMR, key=lambda fnmr: os.stat(fnmr).st_size)
+
+
+def run_solver(nmr, solver, tmax=60):
+    '''Solve nmr with solver. Returns a dict with cost, costLB (the best lower bound
+       known, at least cost_relax), optimal, time, nodes (exact solvers) and order, or
+       None when the solver does not apply (DP beyond DP_MAX_EDGES edges).
+    '''
+    if solver == 'DP' and len(nmr.E) > DP_MAX_EDGES:
+        return None
+    tic = time.time()
+    costLB, nodes = cost_relax(nmr.S, nmr.S), None
+    if solver == 'GD':
+        order, cost = order_greedy(nmr)
+    elif solver == 'SB':
+        order, cost = order_sbbu(nmr)
+    elif solver == 'DP':
+        order, cost = order_dp(nmr)
+        costLB = cost
+    elif solver == 'PT':
+        search = PriorityTree(nmr)
+        order, cost = search.solve(tmax=tmax)
+        costLB, nodes = max(costLB, search.costLB), search.nodes
+    elif solver == 'BB':
+        search = BB(nmr)
+        order, cost = search.solve(tmax=tmax)
+        costLB, nodes = (costLB if search.timeout else cost), search.nodes
+    elif solver == 'BF':
+        search = BB(nmr)
+        order, cost = search.solve_best_first(tmax=tmax)
+        costLB, nodes = max(costLB, search.costLB), search.nodes
+    else:
+        raise ValueError('Unknown solver %s (options: %s)' % (solver, ', '.join(SOLVERS)))
+    return {'cost': int(cost), 'costLB': int(costLB), 'optimal': bool(costLB == cost), 'time': time.time() - tic,
+            'nodes': nodes, 'order': [int(eid) for eid in order]}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Order the prune edges of NMR instances.')
+    parser.add_argument('fnmr', nargs='+', help='instances (.nmr) or folders of instances')
+    parser.add_argument('-s', '--solvers', default='SB',
+                        help='comma-separated solvers (%s), default SB' % ', '.join(SOLVERS))
+    parser.add_argument('-t', '--tmax', type=float, default=60, help='time limit of each exact solver (secs)')
+    parser.add_argument('-o', '--fout', help='append the results (jsonl) to this file')
+    args = parser.parse_args(argv)
+    args.solvers = args.solvers.split(',')
+    for solver in args.solvers:
+        if solver not in SOLVERS:
+            parser.error('unknown solver %s (options: %s)' % (solver, ', '.join(SOLVERS)))
+    return args
+
+
+def main(argv=None):
+    '''Solve the instances of the command line. Returns the results.'''
+    args = parse_args(argv)
+    fid = open(args.fout, 'a') if args.fout is not None else None
+    results = []
+    print('%-28s %-6s %12s %12s %8s %4s' % ('instance', 'solver', 'cost', 'costLB', 'time', 'opt'))
+    for fnmr in list_instances(args.fnmr):
+        nmr = NMR(fnmr)
+        name = os.path.basename(fnmr).replace('.nmr', '')
+        for solver in args.solvers:
+            result = run_solver(nmr, solver, args.tmax)
+            if result is None:
+                print('%-28s %-6s skipped (%d edges > %d)' % (name, solver, len(nmr.E), DP_MAX_EDGES))
+                continue
+            result = dict({'fnmr': fnmr, 'solver': solver, 'tmax': args.tmax}, **result)
+            results.append(result)
+            print('%-28s %-6s %12d %12d %8.3f %4s' % (name, solver, result['cost'], result['costLB'], result['time'], result['optimal']))
+            if fid is not None:
+                fid.write(json.dumps(result) + '\n')
+                fid.flush()
+    if fid is not None:
+        fid.close()
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])